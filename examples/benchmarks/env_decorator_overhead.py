@@ -0,0 +1,58 @@
+import argparse
+import time
+import gymnasium as gym
+from gimitest.env_decorator import EnvDecorator
+from gimitest.gtest import GTest
+
+# Benchmarks the per-step overhead of EnvDecorator against the raw environment.
+
+
+class PostStepGTest(GTest):
+
+    def post_step_test(self, state, action, next_state, reward, terminated, truncated, info, agent_selection):
+        self.step_data["reward"] = reward
+        return state, action, next_state, reward, terminated, truncated, info
+
+
+class AllHooksGTest(PostStepGTest):
+
+    def pre_step_configuration(self):
+        return None
+
+    def pre_step_test(self, agent_selection, action):
+        return action
+
+    def post_step_configuration(self):
+        return None
+
+
+def time_per_step(env, steps, repeats):
+    """Returns the mean time per step (µs) of random actions (best of repeats runs)."""
+    env.action_space.seed(0)
+    actions = [env.action_space.sample() for _ in range(steps)]
+    times = []
+    for _ in range(repeats):
+        env.reset(seed=0)
+        start = time.perf_counter()
+        for action in actions:
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                env.reset()
+        times.append((time.perf_counter() - start) / steps * 1e6)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-step overhead of EnvDecorator.")
+    parser.add_argument("--env", default="CartPole-v1")
+    parser.add_argument("--steps", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    raw = time_per_step(gym.make(args.env), args.steps, args.repeats)
+    print(f"{'raw env':<24} {raw:6.2f} µs/step")
+    for gtest_class in (GTest, PostStepGTest, AllHooksGTest):
+        env = gym.make(args.env)
+        EnvDecorator.decorate(env, gtest_class(env))
+        decorated = time_per_step(env, args.steps, args.repeats)
+        print(f"{gtest_class.__name__:<24} {decorated:6.2f} µs/step (overhead {decorated - raw:5.2f} µs/step)")
@@ -0,0 +1,105 @@
+import argparse
+import os
+import pickle
+import sqlite3
+import tempfile
+import time
+import numpy as np
+from gimitest.glogger import GLogger
+from gimitest.compression import get_codec
+
+# Benchmarks the storage size and the encode/decode throughput of the compression codecs.
+# The observations are synthetic, so no environment is needed: CartPole-like (4 float32) and
+# LunarLander-like (8 float32) random walks and 84x84x3 uint8 images of a moving square on a static background.
+
+
+def cartpole_observations(steps, rng):
+    return np.cumsum(rng.normal(scale=0.02, size=(steps, 4)), axis=0).astype(np.float32)
+
+
+def lunar_lander_observations(steps, rng):
+    observations = np.cumsum(rng.normal(scale=0.01, size=(steps, 8)), axis=0).astype(np.float32)
+    # Leg contacts
+    observations[:, 6:] = 0
+    return observations
+
+
+def image_observations(steps, rng):
+    background = rng.integers(0, 256, size=(84, 84, 3), dtype=np.uint8)
+    observations = np.repeat(background[None], steps, axis=0)
+    for step in range(steps):
+        x = step % 74
+        observations[step, 20:30, x:x + 10] = 255
+    return observations
+
+
+OBSERVATIONS = {
+    "cartpole": cartpole_observations,
+    "lunar_lander": lunar_lander_observations,
+    "image": image_observations,
+}
+
+
+def log_campaign(db_path, codec, observations, episodes):
+    compression = None if codec is None else {"state": codec, "next_state": codec}
+    logger = GLogger(db_path, buffer_size=1000, compression=compression)
+    start = time.perf_counter()
+    for episode in range(episodes):
+        for step in range(len(observations) - 1):
+            logger.step_storage(episode, step, observations[step], 0, observations[step + 1], 1.0,
+                                False, step == len(observations) - 2, {}, {}, None)
+        logger.episode_storage(episode, {}, None)
+    logger.close()
+    return time.perf_counter() - start
+
+
+def benchmark(name, codec, steps, episodes, directory):
+    observations = OBSERVATIONS[name](steps + 1, np.random.default_rng(0))
+    number_of_steps = steps * episodes
+    results = {}
+    if codec is not None:
+        # Codec alone on the pickled observations
+        pickled = [pickle.dumps(observation) for observation in observations]
+        codec_instance = get_codec(codec)
+        start = time.perf_counter()
+        if codec == "delta":
+            payloads = [codec_instance.encode(pickled[0])] + [codec_instance.encode(data, step, reference)
+                                                              for step, (reference, data) in enumerate(zip(pickled, pickled[1:]))]
+        else:
+            payloads = [codec_instance.encode(data) for data in pickled]
+        results["encode MB/s"] = sum(map(len, pickled)) / (time.perf_counter() - start) / 1e6
+        start = time.perf_counter()
+        data = None
+        for payload in payloads:
+            data = codec_instance.decode(payload, data)
+        results["decode MB/s"] = sum(map(len, pickled)) / (time.perf_counter() - start) / 1e6
+
+    db_path = os.path.join(directory, f"{name}_{codec}.db")
+    results["insert steps/s"] = number_of_steps / log_campaign(db_path, codec, observations, episodes)
+    logger = GLogger(db_path)
+    start = time.perf_counter()
+    for _ in logger.iter_steps(columns=("state", "next_state"), batch_size=1000, as_batches=True):
+        pass
+    results["read steps/s"] = number_of_steps / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for step in range(0, steps, max(steps // 20, 1)):
+        logger.load_episode_step(0, step)
+    results["random step loads (ms)"] = (time.perf_counter() - start) * 1000
+    logger.close()
+    with sqlite3.connect(db_path) as conn:
+        results["observation bytes/step"] = conn.execute("SELECT AVG(length(state) + length(next_state)) FROM steps").fetchone()[0]
+    results["file bytes/step"] = os.path.getsize(db_path) / number_of_steps
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GLogger storage size and throughput per compression codec.")
+    parser.add_argument("--episodes", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in OBSERVATIONS:
+            for codec in (None, "zlib", "lzma", "delta"):
+                results = benchmark(name, codec, args.steps, args.episodes, directory)
+                print(f"observations={name:<12} codec={str(codec):<5} " + "  ".join(f"{key}: {value:,.1f}" for key, value in results.items()))
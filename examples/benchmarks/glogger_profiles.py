@@ -0,0 +1,74 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import numpy as np
+from gimitest.glogger import GLogger
+
+# Benchmarks the insert and query throughput of GLogger with the SQLite performance profiles.
+# The logged steps are synthetic CartPole-like steps, so no environment is needed.
+
+
+def log_campaign(logger, episodes, steps, failure_rate, rng):
+    """Logs episodes of CartPole-like steps; failing episodes terminate, the others are truncated."""
+    for episode in range(episodes):
+        failure = rng.random() < failure_rate
+        state = rng.normal(size=4).astype(np.float32)
+        for step in range(steps):
+            next_state = rng.normal(size=4).astype(np.float32)
+            last_step = step == steps - 1
+            logger.step_storage(episode, step, state, int(rng.integers(2)), next_state, 1.0,
+                                last_step and failure, last_step and not failure, {}, {}, None)
+            state = next_state
+        logger.episode_storage(episode, {}, None)
+    logger.flush()
+
+
+def benchmark(profile, buffer_size, episodes, steps, failure_rate, directory):
+    db_path = os.path.join(directory, f"{profile}_{buffer_size}.db")
+    logger = GLogger(db_path, buffer_size=buffer_size, performance_profile=profile)
+    rng = np.random.default_rng(0)
+    results = {}
+
+    start = time.perf_counter()
+    log_campaign(logger, episodes, steps, failure_rate, rng)
+    results["insert steps/s"] = episodes * steps / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for episode in range(episodes):
+        logger.count_episode_steps(episode)
+    results["step counts/s"] = episodes / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    failures = sum(1 for _ in logger.iter_steps(columns=("episode_id", "step"), done=True))
+    failing_episodes = sum(1 for _ in logger.iter_episodes(done=True))
+    results["failure lookups (ms)"] = (time.perf_counter() - start) * 1000
+    assert failures == failing_episodes
+
+    with sqlite3.connect(db_path) as conn:
+        hashes = [row[0] for row in conn.execute("SELECT state_hash FROM steps ORDER BY random() LIMIT 1000")]
+        start = time.perf_counter()
+        for state_hash in hashes:
+            conn.execute("SELECT episode_id, step FROM steps WHERE state_hash = ?", (state_hash,)).fetchall()
+        results["hash lookups/s"] = len(hashes) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    logger.count_distinct_states()
+    results["distinct states (ms)"] = (time.perf_counter() - start) * 1000
+    logger.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GLogger insert and query throughput per performance profile.")
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--failure_rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for buffer_size in (None, 1000):
+            for profile in ("default", "fast"):
+                results = benchmark(profile, buffer_size, args.episodes, args.steps, args.failure_rate, directory)
+                print(f"profile={profile:<8} buffer_size={str(buffer_size):<5} " + "  ".join(f"{name}: {value:,.1f}" for name, value in results.items()))
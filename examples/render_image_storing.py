@@ -1,32 +1,18 @@
 import gymnasium as gym
-import os
-from PIL import Image
 import sys
 sys.path.append('../gimitest')
 from env_decorator import EnvDecorator
 from gtest import GTest
-from glogger import GLogger
-from gtest_decorator import GTestDecorator
+from frames import ImageSink
 
-class RGTest(GTest):
-
-    def __init__(self, env, agent=None, parameters={}):
-        super().__init__(env, agent)
-        self.parameters = parameters
-        self.counter = 0
-
-    def pre_step_test(self, agent_selection, action):
-        # Gets the current observation
-        self.current_image.save(os.path.join(output_dir, f'frame_{self.counter:04d}.png'))
-        self.counter += 1
-        
-        return action
+# The rendered frames are encoded and written on the writer thread of the frame sink,
+# so the environment loop does not wait for the PNG encoding
 
 # Create the environment with the render_mode set to 'rgb_array' to get the rendered frames
 env = gym.make('CartPole-v1', render_mode='rgb_array')
 
 # Create the GTest object
-m_gtest = RGTest(env)
+m_gtest = GTest(env)
 
 # Decorate the environment
 env = EnvDecorator.decorate(env, m_gtest)
@@ -34,9 +20,8 @@ env = EnvDecorator.decorate(env, m_gtest)
 # Reset the environment
 obs, info = env.reset()
 
-# Create a directory to store frames
-output_dir = 'frames'
-os.makedirs(output_dir, exist_ok=True)
+# Store the frames in the directory frames (episode_000000_frame_000000.png, ...)
+frame_sink = m_gtest.enable_frame_sink(ImageSink('frames'))
 
 # Run one episode
 done = False
@@ -58,5 +43,6 @@ while not done:
     
        
 
-# Close the environment
+# Write the remaining frames and close the environment
+frame_sink.close()
 env.close()
\ No newline at end of file
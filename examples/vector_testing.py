@@ -0,0 +1,45 @@
+import numpy
+import gymnasium as gym
+import sys
+sys.path.append('../gimitest')
+from env_decorator import VectorEnvDecorator
+from gtest import VectorGTest
+
+# Tests CartPole with a different pole length in every sub-environment of a vector environment,
+# so that one policy forward pass evaluates NUM_ENVS test configurations.
+
+
+class PoleLengthTester(VectorGTest):
+
+    def pre_reset_configuration(self, env_index):
+        # Every sub-environment gets its own pole length
+        length = self.parameters["lengths"][env_index]
+        cartpole = self.env.envs[env_index].unwrapped
+        cartpole.length = length
+        cartpole.polemass_length = cartpole.masspole * length
+        self.episode_data[env_index]["length"] = length
+        return None
+
+    def post_step_test(self, states, actions, next_states, rewards, terminated, truncated, infos, episodes, steps):
+        # Finished sub-environments are already reset, their episode and step indices are the ones of the step
+        for env_index in numpy.flatnonzero(numpy.logical_or(terminated, truncated)):
+            self.results.append((self.parameters["lengths"][env_index], episodes[env_index], steps[env_index] + 1))
+        return states, actions, next_states, rewards, terminated, truncated, infos
+
+
+NUM_ENVS = 4
+MAX_STEPS = 500
+env = gym.vector.SyncVectorEnv([lambda: gym.make('CartPole-v1') for _ in range(NUM_ENVS)])
+
+m_gtest = PoleLengthTester(env, parameters={"lengths": numpy.linspace(0.25, 1.0, NUM_ENVS)})
+m_gtest.results = []
+VectorEnvDecorator.decorate(env, m_gtest)
+
+states, infos = env.reset(seed=0)
+for _ in range(MAX_STEPS):
+    actions = (states[:, 2] > 0).astype(int)  # One forward pass of a simple policy for all sub-environments
+    states, rewards, terminated, truncated, infos = env.step(actions)
+
+for length, episode, steps in m_gtest.results:
+    print(f"Pole length {length:.2f}, episode {episode}: {steps} steps")
+env.close()
@@ -0,0 +1,120 @@
+import os
+import glob
+import numpy as np
+
+
+class ArrayStore:
+
+    FIELDS = ("step", "state", "action", "next_state", "reward")
+
+    def __init__(self, directory, chunk_size=10000):
+        """Stores trajectories as typed, append-only NumPy arrays.
+
+        Every field is written as .npy shards keyed by episode (directory/field/episode_<id>_<chunk>.npy).
+        The shards hold at most chunk_size steps and are written when they are full or when the episode
+        is flushed. The observations, actions and rewards of an episode must have a fixed shape and type.
+
+        Args:
+            directory (str): Directory of the shards.
+            chunk_size (int): Maximal number of steps per shard.
+        """
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.buffers = {}
+        self.chunk_counts = {}
+        for field in ArrayStore.FIELDS:
+            os.makedirs(os.path.join(directory, field), exist_ok=True)
+
+    def append(self, episode, step, values):
+        """Buffers one step and writes the shards of the episode if the chunk is full.
+
+        Args:
+            episode (int): Episode of the step.
+            step (int): Step index.
+            values (dict): Values of the stored fields (state, action, next_state, reward). The same
+                fields must be given for every step; fields that are never given have no shards.
+        """
+        buffer = self.buffers.get(episode)
+        if buffer is None:
+            buffer = {field: [] for field in ArrayStore.FIELDS}
+            self.buffers[episode] = buffer
+        buffer["step"].append(step)
+        for field, value in values.items():
+            buffer[field].append(value)
+        if len(buffer["step"]) >= self.chunk_size:
+            self.flush(episode)
+
+    def __shard_path(self, field, episode, chunk):
+        return os.path.join(self.directory, field, f"episode_{episode:08d}_{chunk:05d}.npy")
+
+    def __shard_paths(self, field, episode):
+        return sorted(glob.glob(os.path.join(self.directory, field, f"episode_{episode:08d}_*.npy")))
+
+    def flush(self, episode=None):
+        """Writes the buffered steps of an episode (or of all episodes) as new shards."""
+        episodes = list(self.buffers) if episode is None else [episode]
+        for episode in episodes:
+            buffer = self.buffers.pop(episode, None)
+            if buffer is None or len(buffer["step"]) == 0:
+                continue
+            if episode not in self.chunk_counts:
+                self.chunk_counts[episode] = len(self.__shard_paths("step", episode))
+            chunk = self.chunk_counts[episode]
+            for field, values in buffer.items():
+                if len(values) == 0:
+                    continue
+                np.save(self.__shard_path(field, episode, chunk), np.asarray(values))
+            self.chunk_counts[episode] = chunk + 1
+
+    def truncate(self, episode, step):
+        """Removes the steps of an episode from step on; the remaining steps are rewritten as one shard."""
+        self.flush(episode)
+        arrays = {field: self.load_episode(field, episode) for field in ArrayStore.FIELDS}
+        for field in ArrayStore.FIELDS:
+            for path in self.__shard_paths(field, episode):
+                os.remove(path)
+        self.chunk_counts.pop(episode, None)
+        if arrays["step"] is None:
+            return
+        kept = arrays["step"] < step
+        if kept.any():
+            for field, values in arrays.items():
+                if values is not None:
+                    np.save(self.__shard_path(field, episode, 0), values[kept])
+            self.chunk_counts[episode] = 1
+
+    def episodes(self):
+        """Returns the sorted ids of the stored episodes."""
+        paths = glob.glob(os.path.join(self.directory, "step", "episode_*_*.npy"))
+        return sorted({int(os.path.basename(path).split("_")[1]) for path in paths})
+
+    def load_episode(self, field, episode, mmap_mode=None):
+        """Loads one field of an episode as one array (None if the episode is not stored)."""
+        arrays = [np.load(path, mmap_mode=mmap_mode) for path in self.__shard_paths(field, episode)]
+        if len(arrays) == 0:
+            return None
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.concatenate(arrays)
+
+    def load(self, field, episodes=None, mmap_mode=None):
+        """Loads one field of several episodes (default: all) as one contiguous array.
+
+        Args:
+            field (str): One of ArrayStore.FIELDS.
+            episodes (iterable): Episode ids, in the order of the returned steps.
+            mmap_mode (str): Memory-map mode of np.load for the shards.
+
+        Returns:
+            np.ndarray: The concatenated values of the field, or None if no episode is stored.
+        """
+        if field not in ArrayStore.FIELDS:
+            raise ValueError(f"Unknown field {field}, use one of {ArrayStore.FIELDS}.")
+        if episodes is None:
+            episodes = self.episodes()
+        arrays = []
+        for episode in episodes:
+            arrays.extend(np.load(path, mmap_mode=mmap_mode) for path in self.__shard_paths(field, episode))
+        if len(arrays) == 0:
+            return None
+        return np.concatenate(arrays)
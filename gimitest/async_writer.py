@@ -0,0 +1,123 @@
+import threading
+from collections import deque
+
+
+class AsyncWriter:
+
+    BACKPRESSURE_POLICIES = ("block", "drop_oldest", "sample")
+
+    def __init__(self, handle_records, max_size=10000, backpressure="block", sample_interval=10, name="GLoggerWriter"):
+        """Drains a bounded queue of records on a dedicated writer thread.
+
+        Args:
+            handle_records (callable): Called on the writer thread with a list of records.
+                All records that are queued while the previous batch is handled are passed together.
+            max_size (int): Maximal number of queued droppable records.
+            backpressure (str): What happens when a droppable record arrives at a full queue.
+                "block" waits until the writer thread made room, "drop_oldest" drops the oldest
+                queued droppable record, and "sample" only keeps every sample_interval-th record
+                (waiting for room) and drops the others.
+            sample_interval (int): Sampling interval of the "sample" policy.
+            name (str): Name of the writer thread.
+
+        Raises:
+            ValueError: If the backpressure policy is unknown.
+        """
+        if backpressure not in AsyncWriter.BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy {backpressure}, use one of {AsyncWriter.BACKPRESSURE_POLICIES}.")
+        self.handle_records = handle_records
+        self.max_size = max_size
+        self.backpressure = backpressure
+        self.sample_interval = sample_interval
+        self.dropped_records = 0
+        self.error = None
+        self.__records = deque()
+        self.__number_of_droppable_records = 0
+        self.__number_of_full_arrivals = 0
+        self.__busy = False
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__thread.start()
+
+    def put(self, record, droppable=True):
+        """Queues a record for the writer thread.
+
+        Records that are not droppable (e.g. episodes) are always queued and never wait.
+        """
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("The writer is closed.")
+            if droppable and self.__number_of_droppable_records >= self.max_size:
+                if self.backpressure == "drop_oldest":
+                    self.__drop_oldest()
+                elif self.backpressure == "sample":
+                    self.__number_of_full_arrivals += 1
+                    if self.__number_of_full_arrivals % self.sample_interval != 0:
+                        self.dropped_records += 1
+                        return
+                while self.__number_of_droppable_records >= self.max_size:
+                    self.__condition.wait()
+            self.__records.append((droppable, record))
+            if droppable:
+                self.__number_of_droppable_records += 1
+            self.__condition.notify_all()
+
+    def __drop_oldest(self):
+        """Removes the oldest droppable record from the queue."""
+        for i, (droppable, _) in enumerate(self.__records):
+            if droppable:
+                del self.__records[i]
+                self.__number_of_droppable_records -= 1
+                self.dropped_records += 1
+                return
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__records and not self.__closed:
+                    self.__condition.wait()
+                if not self.__records:
+                    return
+                batch = [record for _, record in self.__records]
+                self.__records.clear()
+                self.__number_of_droppable_records = 0
+                self.__busy = True
+                self.__condition.notify_all()
+            try:
+                self.handle_records(batch)
+            except Exception as e:
+                # join() and raise_error() raise the first exception
+                if self.error is None:
+                    self.error = e
+            with self.__condition:
+                self.__busy = False
+                self.__condition.notify_all()
+
+    def join(self):
+        """Waits until all queued records are handled.
+
+        Raises:
+            Exception: The first exception that the writer thread raised while handling records.
+        """
+        with self.__condition:
+            while self.__records or self.__busy:
+                self.__condition.wait()
+        self.raise_error()
+
+    def raise_error(self):
+        """Raises the first exception that the writer thread raised while handling records, without waiting."""
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def close(self):
+        """Handles all queued records and stops the writer thread."""
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join()
+        self.join()
@@ -0,0 +1,287 @@
+import functools
+import types
+from collections import deque
+import numpy as np
+
+# Maximal number of attribute accesses from the environment to the object that defines an attribute
+MAX_ATTRIBUTE_DEPTH = 8
+# Values whose attributes are not searched
+LEAF_TYPES = (str, bytes, bool, int, float, complex, np.ndarray, np.generic, np.dtype, types.ModuleType)
+# Original value of module attributes that did not exist
+MISSING = object()
+# Discovered attribute paths per (environment class, unwrapped environment class, attribute name)
+ATTRIBUTE_PATH_CACHE = {}
+
+
+def defines_attribute(obj, attribute_name):
+    """Returns True if the object itself has the attribute (in its __dict__ or class), and not only by forwarding
+    it with __getattr__ like the wrappers of Gymnasium."""
+    try:
+        if attribute_name in vars(obj):
+            return True
+    except TypeError:
+        pass
+    return any(attribute_name in vars(cls) for cls in type(obj).__mro__)
+
+
+def nested_attributes(obj):
+    """Yields the (name, value) pairs of the attributes of an object that are searched for nested attributes.
+
+    Special attributes, callables (e.g. methods and classes), modules, numbers, strings and arrays are skipped.
+    """
+    try:
+        names = dir(obj)
+    except Exception:
+        return
+    for name in names:
+        if name.startswith("__"):
+            continue
+        try:
+            value = getattr(obj, name)
+        except Exception:
+            continue
+        if value is None or isinstance(value, LEAF_TYPES) or callable(value):
+            continue
+        yield name, value
+
+
+def find_attribute_path(root, attribute_name, max_depth=MAX_ATTRIBUTE_DEPTH):
+    """Searches the object graph of root breadth-first for the closest object that defines the attribute.
+
+    Every object is visited once (cyclic object graphs like Box2D worlds terminate), and the search does not go
+    deeper than max_depth attribute accesses.
+
+    Returns:
+        tuple: The attribute names from root to the object that defines the attribute, or None if it was not found.
+    """
+    queue = deque([(root, ())])
+    # The visited objects are kept alive, so that their ids are not reused by temporary attribute values
+    visited = {id(root): root}
+    while queue:
+        obj, path = queue.popleft()
+        if defines_attribute(obj, attribute_name):
+            return path
+        if len(path) >= max_depth:
+            continue
+        for name, value in nested_attributes(obj):
+            if id(value) not in visited:
+                visited[id(value)] = value
+                queue.append((value, path + (name,)))
+    # Attributes that are only provided by __getattr__
+    return () if hasattr(root, attribute_name) else None
+
+
+def follow_attribute_path(root, path):
+    """Returns the object at the end of an attribute path, or None if the path does not exist."""
+    obj = root
+    try:
+        for name in path:
+            obj = getattr(obj, name)
+    except AttributeError:
+        return None
+    return obj
+
+
+def find_attribute_owner(root, attribute_name):
+    """Returns the object reachable from root that defines the attribute, or None if there is none.
+
+    The path to the object is searched once per (root class, unwrapped root class, attribute name) and cached;
+    later calls follow the cached path and only search again if the object at its end lacks the attribute.
+    """
+    key = (type(root), type(getattr(root, "unwrapped", root)), attribute_name)
+    path = ATTRIBUTE_PATH_CACHE.get(key)
+    if path is not None:
+        owner = follow_attribute_path(root, path)
+        if owner is not None and (defines_attribute(owner, attribute_name) or (path == () and hasattr(owner, attribute_name))):
+            return owner
+    path = find_attribute_path(root, attribute_name)
+    if path is None:
+        return None
+    ATTRIBUTE_PATH_CACHE[key] = path
+    return follow_attribute_path(root, path)
+
+
+def is_property(obj, attribute_name):
+    """Returns True if the attribute is computed by a property of the class of the object (also of extension types),
+    whose getter may have side effects (e.g. lazily created random number generators) or create a new object."""
+    for cls in type(obj).__mro__:
+        if attribute_name in vars(cls):
+            return isinstance(vars(cls)[attribute_name], (property, functools.cached_property, types.GetSetDescriptorType))
+    return False
+
+
+class AttributeIndex:
+
+    def __init__(self, root, max_depth=MAX_ATTRIBUTE_DEPTH, include_properties=False):
+        """Index of the attributes that are reachable from an environment, which maps every attribute name to the
+        paths of the objects that have it and to the type of its value.
+
+        The object graph is walked once, breadth-first, cycle-safe and at most max_depth attribute accesses deep.
+        Callables and special attributes are not indexed, private objects are not followed, and properties are
+        neither read nor followed unless include_properties is True. Lookups, bulk reads and writes and type queries then use the index.
+        After the object graph changed (e.g. Box2D bodies that are recreated at every reset), the index is rebuilt
+        on the next lookup once it is marked stale (EnvDecorator does this at every reset).
+
+        Args:
+            root (object): Environment (or any object) whose attributes are indexed.
+            max_depth (int): Maximal number of attribute accesses from root to an indexed object.
+            include_properties (bool): If True, properties are read and followed, too.
+        """
+        self.root = root
+        self.max_depth = max_depth
+        self.include_properties = include_properties
+        self.entries = {}
+        self.owners = []
+        self.stale = False
+        self.build()
+
+    def build(self):
+        """Walks the object graph and rebuilds the index."""
+        entries = {}
+        owners = []
+        queue = deque([(self.root, ())])
+        visited = {id(self.root): self.root}
+        while queue:
+            obj, path = queue.popleft()
+            owners.append((path, obj))
+            try:
+                names = dir(obj)
+            except Exception:
+                continue
+            for name in names:
+                if name.startswith("__") or (not self.include_properties and is_property(obj, name)):
+                    continue
+                try:
+                    value = getattr(obj, name)
+                except Exception:
+                    continue
+                if callable(value) or isinstance(value, types.ModuleType):
+                    continue
+                entries.setdefault(name, []).append((path, type(value)))
+                # Private objects (e.g. random number generators) are indexed but not followed
+                if (value is None or isinstance(value, LEAF_TYPES) or name.startswith("_") or len(path) >= self.max_depth
+                        or id(value) in visited):
+                    continue
+                visited[id(value)] = value
+                queue.append((value, path + (name,)))
+        self.entries = entries
+        # The indexed objects are kept, so that a changed object graph is detected by identity
+        self.owners = owners
+        self.stale = False
+
+    def refresh(self):
+        """Rebuilds the index if an indexed object was replaced.
+
+        Returns:
+            bool: True if the index was rebuilt.
+        """
+        self.stale = False
+        if all(follow_attribute_path(self.root, path) is obj for path, obj in self.owners):
+            return False
+        self.build()
+        return True
+
+    def __current_entries(self):
+        if self.stale:
+            self.refresh()
+        return self.entries
+
+    def paths(self, attribute_name):
+        """Returns the paths (tuples of attribute names from the root) of all indexed attributes with this name,
+        the closest first."""
+        return [path + (attribute_name,) for path, _ in self.__current_entries().get(attribute_name, [])]
+
+    def __owner(self, attribute_name):
+        entries = self.__current_entries().get(attribute_name)
+        if not entries:
+            raise AttributeError(f"Attribute {attribute_name} is not in the attribute index.")
+        return follow_attribute_path(self.root, entries[0][0])
+
+    def get(self, attribute_name):
+        """Returns the value of the closest attribute with this name.
+
+        Raises:
+            AttributeError: If no attribute with this name is indexed.
+        """
+        return getattr(self.__owner(attribute_name), attribute_name)
+
+    def set(self, attribute_name, value):
+        """Sets the value of the closest attribute with this name.
+
+        Raises:
+            AttributeError: If no attribute with this name is indexed.
+        """
+        setattr(self.__owner(attribute_name), attribute_name, value)
+
+    def get_many(self, attribute_names):
+        """Returns the values of several attributes as a dictionary."""
+        return {attribute_name: self.get(attribute_name) for attribute_name in attribute_names}
+
+    def set_many(self, values):
+        """Sets several attributes from a dictionary of attribute names and values."""
+        for attribute_name, value in values.items():
+            self.set(attribute_name, value)
+
+    def find(self, value_types=(float,)):
+        """Returns the indexed attributes whose values had one of the types when they were indexed,
+        e.g. all float parameters, as a dictionary of dotted paths (e.g. "env.env.gravity") and current values.
+        Booleans are only found if bool is one of the types."""
+        found = {}
+        for attribute_name, entries in self.__current_entries().items():
+            for path, value_type in entries:
+                if issubclass(value_type, value_types) and (value_type is not bool or bool in value_types):
+                    owner = follow_attribute_path(self.root, path)
+                    if owner is not None and hasattr(owner, attribute_name):
+                        found[".".join(path + (attribute_name,))] = getattr(owner, attribute_name)
+        return found
+
+
+class ModuleAttributes:
+
+    def __init__(self, module):
+        """Reads and writes the attributes of a module (e.g. the physics constants of the module of a Box2D
+        environment) and remembers their original values, so that they can be restored.
+
+        Args:
+            module (module): The module.
+        """
+        self.module = module
+        self.original_values = {}
+
+    def get(self, attribute_name):
+        """Returns the value of a module attribute."""
+        return getattr(self.module, attribute_name)
+
+    def set(self, attribute_name, value):
+        """Sets a module attribute; its value before the first change is kept for restore()."""
+        self.set_many({attribute_name: value})
+
+    def set_many(self, values):
+        """Sets several module attributes at once; if one of them can not be set, the others are rolled back."""
+        changed = []
+        try:
+            for attribute_name, value in values.items():
+                original_value = getattr(self.module, attribute_name, MISSING)
+                setattr(self.module, attribute_name, value)
+                changed.append((attribute_name, original_value))
+        except Exception:
+            for attribute_name, original_value in reversed(changed):
+                self.__set_or_delete(attribute_name, original_value)
+            raise
+        for attribute_name, original_value in changed:
+            self.original_values.setdefault(attribute_name, original_value)
+
+    def __set_or_delete(self, attribute_name, value):
+        if value is MISSING:
+            delattr(self.module, attribute_name)
+        else:
+            setattr(self.module, attribute_name, value)
+
+    def restore(self, attribute_names=None):
+        """Restores the original values of the changed module attributes (default: of all of them).
+        Attributes that the module did not have are deleted again."""
+        if attribute_names is None:
+            attribute_names = list(self.original_values)
+        for attribute_name in attribute_names:
+            if attribute_name in self.original_values:
+                self.__set_or_delete(attribute_name, self.original_values.pop(attribute_name))
@@ -0,0 +1,121 @@
+import lzma
+import struct
+import zlib
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class Codec(ABC):
+
+    name = None
+
+    @abstractmethod
+    def encode(self, data, reference_step=None, reference=None):
+        """Override this method to compress the pickled bytes of a value.
+
+        Args:
+            data (bytes): Pickled value.
+            reference_step (int): Step of the reference (only used by delta codecs).
+            reference (bytes): Pickled value of the previous step of the same field and episode, None for a keyframe.
+        """
+
+    @abstractmethod
+    def decode(self, payload, reference=None):
+        """Override this method to return the pickled bytes of a compressed value."""
+
+    def reference_step(self, payload):
+        """Returns the step whose value is needed to decode the payload (None if it is self-contained)."""
+        return None
+
+    def parameters(self):
+        """Returns the constructor arguments of the codec, which are stored with its name in the database."""
+        return {}
+
+
+class ZlibCodec(Codec):
+
+    name = "zlib"
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def parameters(self):
+        return {"level": self.level}
+
+    def encode(self, data, reference_step=None, reference=None):
+        return zlib.compress(data, self.level)
+
+    def decode(self, payload, reference=None):
+        return zlib.decompress(payload)
+
+
+class LzmaCodec(Codec):
+
+    name = "lzma"
+
+    def __init__(self, preset=6):
+        self.preset = preset
+
+    def parameters(self):
+        return {"preset": self.preset}
+
+    def encode(self, data, reference_step=None, reference=None):
+        return lzma.compress(data, preset=self.preset)
+
+    def decode(self, payload, reference=None):
+        return lzma.decompress(payload)
+
+
+class DeltaCodec(Codec):
+
+    name = "delta"
+
+    def __init__(self, keyframe_interval=100, level=6):
+        """XORs the pickled value with the value of the previous step and compresses the result with zlib.
+
+        Consecutive observations are highly correlated, so the XOR is mostly zero bytes. Every
+        keyframe_interval-th value of an episode is stored as a keyframe, which bounds the number of
+        values that are decoded to load a single step.
+        """
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+
+    def parameters(self):
+        return {"keyframe_interval": self.keyframe_interval, "level": self.level}
+
+    def encode(self, data, reference_step=None, reference=None):
+        if reference is None or len(reference) != len(data):
+            return b"K" + zlib.compress(data, self.level)
+        delta = np.bitwise_xor(np.frombuffer(data, np.uint8), np.frombuffer(reference, np.uint8))
+        return b"D" + struct.pack("<q", reference_step) + zlib.compress(delta.tobytes(), self.level)
+
+    def decode(self, payload, reference=None):
+        if payload[:1] == b"K":
+            return zlib.decompress(payload[1:])
+        delta = np.frombuffer(zlib.decompress(payload[9:]), np.uint8)
+        return np.bitwise_xor(delta, np.frombuffer(reference, np.uint8)).tobytes()
+
+    def reference_step(self, payload):
+        if payload[:1] == b"K":
+            return None
+        return struct.unpack("<q", payload[1:9])[0]
+
+
+CODECS = {
+    "zlib": ZlibCodec,
+    "lzma": LzmaCodec,
+    "delta": DeltaCodec,
+}
+
+
+def get_codec(codec, parameters=None):
+    """Returns a codec instance for a codec name (constructed with the parameters) or instance.
+
+    Raises:
+        ValueError: If the codec name is unknown.
+    """
+    if isinstance(codec, Codec):
+        return codec
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec}, use one of {list(CODECS)} or a Codec instance.")
+    return CODECS[codec](**(parameters or {}))
@@ -1,6 +1,13 @@
+import sys
+import warnings
 import gymnasium as gym  # Importing gymnasium as gym to work as the base for the decorator
-from PIL import Image
 import numpy as np
+
+STEP_HOOKS = ("pre_step_configuration", "pre_step_test", "post_step_configuration", "post_step_test")
+# Detected API style (old_style) per environment class
+API_STYLE_CACHE = {}
+
+
 class EnvDecorator:
 
     @staticmethod
@@ -18,61 +25,114 @@ class EnvDecorator:
        
 
     @staticmethod
-    def decorate(env, gtest):
-        number_of_return_values = EnvDecorator.check_return_values(env.reset)
-        old_style = False
-        if number_of_return_values == 1:
-            old_style = True
+    def overridden_hooks(gtest, hooks=STEP_HOOKS):
+        """Returns the hooks that the GTest subclass or instance overrides (see gimitest.gtest.default_hook)."""
+        return {hook for hook in hooks if not getattr(getattr(gtest, hook, None), "default_hook", False)}
+
+    @staticmethod
+    def is_turn_based(env):
+        """Returns True for turn-based (PettingZoo AEC) environments, which select an agent per step.
+
+        The class of the environment itself is checked and not env.unwrapped, since the unwrapped environment of a
+        parallel environment created with aec_to_parallel is the turn-based one.
+        """
+        return callable(getattr(type(env), "last", None))
+
+    @staticmethod
+    def detect_old_style(env):
+        """Returns True if the environment uses the old Gym API (reset returns only the observation and step
+        returns four values).
+
+        The API style is derived from the base types: Gymnasium and PettingZoo environments use the new API,
+        environments of the gym package before version 0.26 the old one. Only for other environments, env.reset()
+        is called once per environment class. The result is cached per environment class.
+        """
+        unwrapped = getattr(env, "unwrapped", env)
+        key = (type(env), type(unwrapped))
+        if key in API_STYLE_CACHE:
+            return API_STYLE_CACHE[key]
+        modules = [cls.__module__.split(".")[0] for cls in type(env).__mro__ + type(unwrapped).__mro__]
+        if isinstance(env, gym.Env) or "pettingzoo" in modules:
+            old_style = False
+        elif "gym" in modules and "gym" in sys.modules:
+            version = getattr(sys.modules["gym"], "__version__", "0.26")
+            old_style = tuple(int(part) for part in version.split(".")[:2] if part.isdigit()) < (0, 26)
+        else:
+            old_style = EnvDecorator.check_return_values(env.reset) == 1
+        API_STYLE_CACHE[key] = old_style
+        return old_style
+
+    @staticmethod
+    def decorate(env, gtest, old_style=None):
+        """Decorates the step, reset and render functions of the environment with the hooks of the GTest.
+
+        Args:
+            env (object): Gymnasium, gym or PettingZoo environment.
+            gtest (GTest): The test.
+            old_style (bool): If True, the environment uses the old Gym API (see detect_old_style, which is used if None).
+        """
+        if old_style is None:
+            old_style = EnvDecorator.detect_old_style(env)
         env.tmp_storage_of_state = None
+        gtest.original_step_function = env.step
+        gtest.old_style = old_style
         env.step = EnvDecorator.__decorate_step_function(env, env.step, gtest, old_style)
         env.reset = EnvDecorator.__decorate_reset_function(env, env.reset, gtest, old_style)
         env.render = EnvDecorator.__decorate_render_function(env, env.render, gtest)
         gtest.env = env
         return env
 
+    @staticmethod
+    def update_step_hooks(gtest):
+        """Rebuilds the step function of the decorated environment after step hooks of the GTest were replaced
+        (e.g. by GTestDecorator.decorate_with_logger)."""
+        if getattr(gtest, "original_step_function", None) is not None:
+            gtest.env.step = EnvDecorator.__decorate_step_function(gtest.env, gtest.original_step_function, gtest, gtest.old_style)
+
     @staticmethod
     def __decorate_step_function(env, original_step_function, gtest, old_style):
+        # The wrapper only calls the hooks that the GTest overrides, and the type of the environment is resolved once
+        overridden_hooks = EnvDecorator.overridden_hooks(gtest)
+        pre_step_configuration = gtest.pre_step_configuration if "pre_step_configuration" in overridden_hooks else None
+        pre_step_test = gtest.pre_step_test if "pre_step_test" in overridden_hooks else None
+        post_step_configuration = gtest.post_step_configuration if "post_step_configuration" in overridden_hooks else None
+        post_step_test = gtest.post_step_test if "post_step_test" in overridden_hooks else None
+        turn_based = EnvDecorator.is_turn_based(env)
+
         def wrapper(*action_args, **kwargs):
-            if gtest.decorated:
-                gtest.pre_step_configuration()
-                try:
-                    # Try to get agent selection in turn-based games
-                    agent_selection = env.agent_selection
-                except:
-                    # If not possible, set to None
-                    agent_selection = None
-                
-                # Makes it possible to test, for instance, alternative actions
-                action = gtest.pre_step_test( agent_selection, action_args[0])
+            if not gtest.decorated:
+                return original_step_function(*action_args, **kwargs)
+            if pre_step_configuration is not None:
+                pre_step_configuration()
+            # Only turn-based games have an agent selection
+            agent_selection = env.agent_selection if turn_based else None
+
+            # Makes it possible to test, for instance, alternative actions
+            if pre_step_test is not None:
+                action = pre_step_test(agent_selection, action_args[0])
                 if action is not None:
-                    action_args = list(action_args)
-                    action_args[0] = action
-                    action_args = tuple(action_args)
+                    action_args = (action,) + action_args[1:]
 
-                # Call the original step function
-                if agent_selection is None:
-                    if old_style:
-                        original_next_state, original_reward, original_terminated, original_info = original_step_function(*action_args, **kwargs)
-                        original_truncated = False
-                    else:
-                        original_next_state, original_reward, original_terminated, original_truncated, original_info = original_step_function(*action_args, **kwargs)
-                else:
-                    original_step_function(*action_args, **kwargs)
-                    original_next_state, original_reward, original_terminated, original_truncated, original_info = env.last()
-                    
-                gtest.post_step_configuration()
-                tmp_next_state = original_next_state
-                tmp_reward = original_reward
-                tmp_terminated = original_terminated
-                tmp_truncated = original_truncated
-                tmp_info = original_info
-                tmp_state, tmp_action_args, tmp_next_state, tmp_reward, tmp_terminated, tmp_truncated, tmp_info = gtest.post_step_test(env.tmp_storage_of_state, action_args, original_next_state, original_reward, original_terminated, original_truncated, tmp_info, agent_selection)
-                env.tmp_storage_of_state = original_next_state
-                return tmp_next_state, tmp_reward, tmp_terminated, tmp_truncated, tmp_info
+            # Call the original step function
+            if turn_based:
+                original_step_function(*action_args, **kwargs)
+                next_state, reward, terminated, truncated, info = env.last()
+            elif old_style:
+                next_state, reward, terminated, info = original_step_function(*action_args, **kwargs)
+                truncated = False
             else:
-                return original_step_function(*action_args, **kwargs)
-            
-        
+                next_state, reward, terminated, truncated, info = original_step_function(*action_args, **kwargs)
+
+            if post_step_configuration is not None:
+                post_step_configuration()
+            if post_step_test is not None:
+                _, _, tmp_next_state, tmp_reward, tmp_terminated, tmp_truncated, tmp_info = post_step_test(
+                    env.tmp_storage_of_state, action_args, next_state, reward, terminated, truncated, info, agent_selection)
+                env.tmp_storage_of_state = next_state
+                return tmp_next_state, tmp_reward, tmp_terminated, tmp_truncated, tmp_info
+            env.tmp_storage_of_state = next_state
+            return next_state, reward, terminated, truncated, info
+
         return wrapper
 
     @staticmethod
@@ -80,6 +140,11 @@ class EnvDecorator:
         def wrapper(*args, **kwargs):
             if gtest.decorated:
                 gtest.pre_reset_test()
+                # pre_reset_test still sees the frames of the finished episode
+                if gtest.frame_buffer is not None:
+                    gtest.frame_buffer.clear()
+                if gtest.frame_sink is not None:
+                    gtest.frame_sink.end_episode()
                 more_args = gtest.pre_reset_configuration()
                 # Check if more_args is instance
                 if isinstance(more_args, dict)==False:
@@ -98,6 +163,9 @@ class EnvDecorator:
                     original_reset_function(*args, **kwargs)
                     next_state, reward, done, truncated, info = env.last()
 
+                # The reset may have replaced objects of the environment (e.g. Box2D bodies)
+                if gtest.attribute_index is not None:
+                    gtest.attribute_index.stale = True
                 
                 tmp_next_state = gtest.post_reset_test()
                 if tmp_next_state is not None:
@@ -123,8 +191,8 @@ class EnvDecorator:
                 render_result = original_render_function(*args, **kwargs)
                 
                 if isinstance(render_result, np.ndarray):
-                    # If the render result is a numpy array, convert it to a PIL Image
-                    gtest.current_image = Image.fromarray(render_result)
+                    # The frame is only converted into a PIL image when the test accesses gtest.current_image
+                    gtest.set_current_frame(render_result)
 
                 gtest.post_render()
 
@@ -132,4 +200,103 @@ class EnvDecorator:
             else:
                 return original_render_function(*args, **kwargs)
             
-        return wrapper
\ No newline at end of file
+        return wrapper
+
+
+class VectorEnvDecorator:
+
+    @staticmethod
+    def decorate(env, gtest):
+        """Decorates the step and reset functions of a gymnasium.vector environment with the hooks of a VectorGTest.
+
+        The step hooks are called once per batched step. The reset hooks are called per sub-environment at the
+        initial reset and at every autoreset, which happens during the step that finishes the episode: pre_reset_test
+        still sees the finished episode, then the next episode of the sub-environment starts. For a SyncVectorEnv, they run right before and after the reset of the
+        sub-environment, so that pre_reset_configuration can configure self.env.envs[env_index] and return reset
+        arguments. The sub-environments of an AsyncVectorEnv reset themselves in their worker processes, so the
+        hooks run in the main process after the reset and returned reset arguments can not be applied; decorating
+        an AsyncVectorEnv with a VectorGTest that overrides pre_reset_configuration warns about this.
+        """
+        synchronous = isinstance(env.unwrapped, gym.vector.SyncVectorEnv)
+        if not synchronous and EnvDecorator.overridden_hooks(gtest, ("pre_reset_configuration",)):
+            warnings.warn("The sub-environments of an AsyncVectorEnv reset themselves in their worker processes, so the "
+                          "reset arguments that pre_reset_configuration returns are ignored; use a SyncVectorEnv to "
+                          "configure the resets of the sub-environments.", stacklevel=2)
+        env.tmp_storage_of_state = None
+        if synchronous:
+            for env_index, sub_env in enumerate(env.unwrapped.envs):
+                sub_env.reset = VectorEnvDecorator.__decorate_sub_env_reset_function(sub_env.reset, gtest, env_index)
+        env.step = VectorEnvDecorator.__decorate_step_function(env, env.step, gtest, synchronous)
+        env.reset = VectorEnvDecorator.__decorate_reset_function(env, env.reset, gtest, synchronous)
+        gtest.env = env
+        return env
+
+    @staticmethod
+    def __reset_hooks_after_reset(gtest, next_states, env_indices):
+        """Calls the reset hooks of sub-environments that were already reset (AsyncVectorEnv)."""
+        for env_index in env_indices:
+            gtest.pre_reset_test(env_index)
+            gtest.episode_increment(env_index)
+            gtest.pre_reset_configuration(env_index)
+            tmp_next_state = gtest.post_reset_test(env_index)
+            if tmp_next_state is not None:
+                next_states[env_index] = tmp_next_state
+            tmp_state = gtest.post_reset_configuration(env_index, next_states[env_index])
+            if tmp_state is not None:
+                next_states[env_index] = tmp_state
+
+    @staticmethod
+    def __decorate_sub_env_reset_function(original_reset_function, gtest, env_index):
+        def wrapper(*args, **kwargs):
+            if not gtest.decorated:
+                return original_reset_function(*args, **kwargs)
+            gtest.pre_reset_test(env_index)
+            gtest.episode_increment(env_index)
+            more_args = gtest.pre_reset_configuration(env_index)
+            if isinstance(more_args, dict):
+                kwargs.update(more_args)
+            next_state, info = original_reset_function(*args, **kwargs)
+            tmp_next_state = gtest.post_reset_test(env_index)
+            if tmp_next_state is not None:
+                next_state = tmp_next_state
+            tmp_state = gtest.post_reset_configuration(env_index, next_state)
+            if tmp_state is not None:
+                next_state = tmp_state
+            return next_state, info
+        return wrapper
+
+    @staticmethod
+    def __decorate_step_function(env, original_step_function, gtest, synchronous):
+        def wrapper(actions):
+            if not gtest.decorated:
+                return original_step_function(actions)
+            # Indices of the step, finished sub-environments are reset during the step
+            episodes = gtest.episodes.copy()
+            steps = gtest.steps.copy()
+            gtest.pre_step_configuration()
+            tmp_actions = gtest.pre_step_test(actions)
+            if tmp_actions is not None:
+                actions = tmp_actions
+            next_states, rewards, terminated, truncated, infos = original_step_function(actions)
+            done = np.logical_or(terminated, truncated)
+            if not synchronous and done.any():
+                VectorEnvDecorator.__reset_hooks_after_reset(gtest, next_states, np.flatnonzero(done))
+            gtest.post_step_configuration()
+            _, _, next_states, rewards, terminated, truncated, infos = gtest.post_step_test(
+                env.tmp_storage_of_state, actions, next_states, rewards, terminated, truncated, infos, episodes, steps)
+            env.tmp_storage_of_state = next_states
+            gtest.step_increment(done)
+            return next_states, rewards, terminated, truncated, infos
+        return wrapper
+
+    @staticmethod
+    def __decorate_reset_function(env, original_reset_function, gtest, synchronous):
+        def wrapper(*args, **kwargs):
+            if not gtest.decorated:
+                return original_reset_function(*args, **kwargs)
+            next_states, infos = original_reset_function(*args, **kwargs)
+            if not synchronous:
+                VectorEnvDecorator.__reset_hooks_after_reset(gtest, next_states, range(gtest.num_envs))
+            env.tmp_storage_of_state = next_states
+            return next_states, infos
+        return wrapper
@@ -0,0 +1,255 @@
+import math
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+def hashable_key(value):
+    """Returns a hashable representation of a value (NumPy arrays are represented by dtype, shape and bytes)."""
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, (tuple, list)):
+        return tuple(hashable_key(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, hashable_key(item)) for key, item in value.items())
+    return value
+
+
+def quantile_key(q):
+    """Returns the name of the q-quantile without loss of its digits, e.g. p50 for 0.5 and p99.9 for 0.999."""
+    return f"p{round(q * 100, 10):.12g}"
+
+
+class P2Quantile:
+
+    def __init__(self, q):
+        """Estimates the q-quantile of a stream with the P² algorithm (Jain and Chlamtac) in O(1) memory and time per value."""
+        self.q = q
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired_positions = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def update(self, value):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            if len(heights) == 5:
+                heights.sort()
+            return
+        positions = self.positions
+        # Cell of the new value
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        desired_positions = self.desired_positions
+        for i in range(5):
+            desired_positions[i] += self.increments[i]
+        # Adjust the heights of the middle markers
+        for i in (1, 2, 3):
+            d = desired_positions[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+                    (positions[i] - positions[i - 1] + d) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+                    + (positions[i + 1] - positions[i] - d) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+                if not heights[i - 1] < height < heights[i + 1]:
+                    # Linear prediction if the parabolic one leaves the neighbouring heights
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def value(self):
+        """Returns the current estimate (None without values)."""
+        if len(self.heights) == 5:
+            return self.heights[2]
+        if not self.heights:
+            return None
+        values = sorted(self.heights)
+        return values[int(round(self.q * (len(values) - 1)))]
+
+
+class RunningStatistics:
+
+    def __init__(self, quantiles=()):
+        """Count, sum, mean and variance (Welford), min, max and quantile sketches of a stream of numbers."""
+        self.quantiles = quantiles
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketches = [P2Quantile(q) for q in self.quantiles]
+
+    def update(self, value):
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        for sketch in self.sketches:
+            sketch.update(value)
+
+    def result(self, prefix=""):
+        """Returns the statistics as a JSON serializable dictionary (variance is the population variance).
+
+        Args:
+            prefix (str): Prefix of the keys (e.g. reward_ for reward_mean), so the flattened episode keys of
+                several statistics do not shadow each other.
+        """
+        result = {
+            f"{prefix}count": self.count,
+            f"{prefix}mean": float(self.mean) if self.count else None,
+            f"{prefix}variance": float(self.m2 / self.count) if self.count else None,
+            f"{prefix}min": float(self.min) if self.min is not None else None,
+            f"{prefix}max": float(self.max) if self.max is not None else None,
+        }
+        for sketch in self.sketches:
+            value = sketch.value()
+            result[prefix + quantile_key(sketch.q)] = float(value) if value is not None else None
+        return result
+
+
+class ActionCounter:
+
+    def __init__(self):
+        """Counts the actions of an episode, including unhashable (array) actions."""
+        self.counts = {}
+
+    def reset(self):
+        self.counts = {}
+
+    def update(self, action):
+        counts = self.counts
+        try:
+            counts[action] = counts.get(action, 0) + 1
+        except TypeError:
+            key = hashable_key(action)
+            counts[key] = counts.get(key, 0) + 1
+
+    def number_of_actions(self):
+        return sum(self.counts.values())
+
+    def entropy(self):
+        """Entropy (bits) of the action distribution."""
+        total = self.number_of_actions()
+        entropy = 0.0
+        for count in self.counts.values():
+            probability = count / total
+            entropy -= probability * math.log2(probability)
+        return entropy
+
+
+class Aggregator(ABC):
+
+    @abstractmethod
+    def update(self, episode, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection):
+        """Override this method to aggregate a step (same arguments as GLogger.step_storage)."""
+
+    @abstractmethod
+    def result(self):
+        """Override this method to return the JSON serializable value that is stored in the episode data."""
+
+    def reset(self):
+        """Override this method to reset the aggregator for a new episode."""
+        pass
+
+
+class ValueAggregator(Aggregator):
+
+    def __init__(self, selector, quantiles=(), prefix=""):
+        """Running statistics of a number that the selector computes from the step arguments.
+
+        Example: ValueAggregator(lambda episode, step, state, *_: float(state[2]), prefix="pole_angle_") aggregates
+        the pole angle of CartPole into pole_angle_mean, pole_angle_min, ...
+        """
+        self.selector = selector
+        self.prefix = prefix
+        self.statistics = RunningStatistics(quantiles)
+
+    def update(self, *step):
+        value = self.selector(*step)
+        if value is not None:
+            self.statistics.update(value)
+
+    def result(self):
+        return self.statistics.result(self.prefix)
+
+    def reset(self):
+        self.statistics.reset()
+
+
+class EpisodeStatistics:
+
+    def __init__(self, quantiles=(0.5, 0.9, 0.99)):
+        """Online episode summaries of GLogger with O(1) work per step.
+
+        Args:
+            quantiles (tuple): Quantiles of the step time that are estimated with P² sketches.
+        """
+        self.quantiles = quantiles
+        self.aggregators = {}
+        self.actions = ActionCounter()
+        self.rewards = RunningStatistics()
+        self.step_times = RunningStatistics(quantiles)
+        self.collected_reward = 0
+        self.last_time = None
+
+    def register(self, name, aggregator):
+        """Registers an aggregator whose result is stored as episode_data[name]."""
+        self.aggregators[name] = aggregator
+
+    def reset(self):
+        self.actions.reset()
+        self.rewards.reset()
+        self.step_times.reset()
+        self.collected_reward = 0
+        self.last_time = None
+        for aggregator in self.aggregators.values():
+            aggregator.reset()
+
+    def update(self, record, reward, timestamp):
+        """Aggregates a step record (the arguments of GLogger.step_storage), its summed up reward and timestamp."""
+        if self.last_time is not None:
+            self.step_times.update(timestamp - self.last_time)
+        self.last_time = timestamp
+        self.actions.update(record[3])
+        try:
+            self.collected_reward += reward
+            self.rewards.update(float(reward))
+        except:
+            pass
+        for aggregator in self.aggregators.values():
+            aggregator.update(*record)
+
+    def result(self):
+        """Returns the episode summary that is added to the episode data."""
+        number_of_actions = self.actions.number_of_actions()
+        result = {
+            "collected_reward": float(self.collected_reward),
+            "entropy_of_actions": self.actions.entropy(),
+            "number_of_unique_actions": len(self.actions.counts),
+            "number_of_states": number_of_actions + 1,
+            "avg_time_per_step": float(self.step_times.mean) if self.step_times.count else None,
+            "reward_statistics": self.rewards.result("reward_"),
+            "step_time_statistics": self.step_times.result("step_time_"),
+        }
+        for name, aggregator in self.aggregators.items():
+            result[name] = aggregator.result()
+        return result
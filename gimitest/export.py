@@ -0,0 +1,219 @@
+import json
+import os
+import pickle
+import numpy as np
+
+FILE_FORMATS = ("parquet", "arrow")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+# Columns of the steps table with a fixed Arrow type
+STEP_COLUMN_TYPES = {
+    "episode_id": "int64",
+    "step": "int64",
+    "done": "bool_",
+    "truncated": "bool_",
+    "reward_value": "float64",
+}
+
+
+def import_pyarrow():
+    """Returns the pyarrow module.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("The Parquet/Arrow export needs pyarrow (pip install pyarrow).") from e
+    return pyarrow
+
+
+class ColumnConverter:
+
+    def __init__(self, pa, name, values, fallback="pickle", arrow_type=None):
+        """Converts the batches of a column into Arrow arrays of one type, which is derived from the first batch.
+
+        NumPy arrays of the same shape and numeric dtype become fixed-size list columns (the shape is stored
+        in the field metadata), scalars and strings become typed columns, and other values are pickled
+        (fallback="pickle") or serialized as JSON (fallback="json"). Integers become float64 columns, since a later
+        batch may hold floats (e.g. rewards of 0 and 0.5), unless arrow_type fixes the type.
+        """
+        self.pa = pa
+        self.name = name
+        self.fallback = fallback
+        self.shape = None
+        self.dtype = None
+        metadata = None
+        if arrow_type is not None:
+            self.kind = "typed"
+            self.type = getattr(pa, arrow_type)()
+        elif self.__fixed_shape_arrays(values):
+            self.kind = "array"
+            self.size = int(np.prod(self.shape))
+            self.type = pa.list_(pa.from_numpy_dtype(self.dtype), self.size)
+            metadata = {"gimitest.shape": json.dumps(list(self.shape))}
+        else:
+            try:
+                self.type = pa.array([self.__scalar(value) for value in values]).type
+                self.kind = "typed"
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                self.type = pa.null()
+            if pa.types.is_integer(self.type):
+                self.type = pa.float64()
+            if pa.types.is_null(self.type) or pa.types.is_nested(self.type):
+                self.kind = fallback
+                self.type = pa.binary() if fallback == "pickle" else pa.string()
+                metadata = {"gimitest.encoding": fallback}
+        self.field = pa.field(name, self.type, metadata=metadata)
+
+    def __fixed_shape_arrays(self, values):
+        arrays = [value for value in values if value is not None]
+        if not arrays or not all(isinstance(value, np.ndarray) for value in arrays):
+            return False
+        self.shape, self.dtype = arrays[0].shape, arrays[0].dtype
+        return self.dtype.kind in "biuf" and all(value.shape == self.shape and value.dtype == self.dtype for value in arrays)
+
+    @staticmethod
+    def __scalar(value):
+        return value.item() if isinstance(value, np.generic) else value
+
+    def convert(self, values):
+        """Returns the Arrow array of a batch of values.
+
+        Raises:
+            ValueError: If an array of the batch has another shape or dtype than the arrays of the first batch,
+                or a value can not be converted into the type of the column without loss.
+        """
+        pa = self.pa
+        if self.kind == "array":
+            flat = np.zeros((len(values), self.size), self.dtype)
+            mask = np.zeros(len(values), bool)
+            for i, value in enumerate(values):
+                if value is None:
+                    mask[i] = True
+                elif not isinstance(value, np.ndarray) or value.shape != self.shape or value.dtype != self.dtype:
+                    raise ValueError(f"The values of {self.name} must be arrays of shape {self.shape} and dtype {self.dtype}.")
+                else:
+                    flat[i] = value.ravel()
+            return pa.FixedSizeListArray.from_arrays(pa.array(flat.ravel()), self.size, mask=pa.array(mask) if mask.any() else None)
+        if self.kind == "typed" and pa.types.is_boolean(self.type):
+            # SQLite stores the flags as integers
+            return pa.array([bool(value) if value is not None else None for value in values], type=self.type)
+        if self.kind == "typed":
+            values = [self.__scalar(value) for value in values]
+            if pa.types.is_integer(self.type) and any(isinstance(value, float) for value in values):
+                raise ValueError(f"The column {self.name} has the type {self.type}, but holds floats.")
+            try:
+                return pa.array(values, type=self.type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError(f"The values of {self.name} can not be converted into {self.type}: {e}") from e
+        if self.kind == "pickle":
+            return pa.array([pickle.dumps(value) if value is not None else None for value in values], type=self.type)
+        return pa.array([json.dumps(value, default=str) if value is not None else None for value in values], type=self.type)
+
+
+class BatchWriter:
+
+    def __init__(self, filepath, file_format=None, compression="zstd", fallback="pickle", column_types=None):
+        """Writes batches (dictionaries of column lists) into a Parquet or Arrow IPC file.
+
+        The schema is derived from the first batch, every batch becomes one row group (Parquet) or record batch (Arrow).
+
+        Args:
+            filepath (str): Path of the file.
+            file_format (str): "parquet" or "arrow" (default: "arrow" for .arrow, .feather and .ipc files, otherwise "parquet").
+            compression (str): Compression of the file (e.g. "zstd", "snappy" for Parquet, "lz4" for Arrow or None).
+            fallback (str): Encoding of values that have no Arrow type ("pickle" or "json").
+            column_types (dict): Fixed Arrow type names (e.g. "int64") per column.
+
+        Raises:
+            ValueError: If the file format is unknown.
+        """
+        if file_format is None:
+            file_format = "arrow" if os.path.splitext(filepath)[1] in ARROW_EXTENSIONS else "parquet"
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"Unknown file format {file_format}, use one of {FILE_FORMATS}.")
+        self.pa = import_pyarrow()
+        self.filepath = filepath
+        self.file_format = file_format
+        self.compression = compression
+        self.fallback = fallback
+        self.column_types = column_types or {}
+        self.converters = None
+        self.schema = None
+        self.writer = None
+        self.number_of_rows = 0
+
+    def __open(self, schema):
+        pa = self.pa
+        if self.file_format == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self.filepath, schema, compression=self.compression)
+        import pyarrow.ipc
+        return pa.ipc.new_file(self.filepath, schema, options=pa.ipc.IpcWriteOptions(compression=self.compression))
+
+    def write(self, batch):
+        if self.converters is None:
+            self.converters = [ColumnConverter(self.pa, column, values, self.fallback, self.column_types.get(column))
+                               for column, values in batch.items()]
+            self.schema = self.pa.schema([converter.field for converter in self.converters])
+            self.writer = self.__open(self.schema)
+        arrays = [converter.convert(batch[converter.name]) for converter in self.converters]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.number_of_rows += len(arrays[0]) if arrays else 0
+
+    def close(self, columns=()):
+        """Closes the file; without batches, an empty file is written whose columns without a fixed type are null columns."""
+        if self.writer is None:
+            pa = self.pa
+            self.writer = self.__open(pa.schema([
+                pa.field(column, getattr(pa, self.column_types[column])() if column in self.column_types else pa.null())
+                for column in columns
+            ]))
+        self.writer.close()
+        return self.number_of_rows
+
+
+def export_steps(logger, filepath, columns, file_format=None, compression="zstd", batch_size=10000, **filters):
+    """Streams the logged steps of a GLogger into a Parquet or Arrow file (see GLogger.export_steps).
+
+    Returns:
+        int: The number of exported steps.
+    """
+    writer = BatchWriter(filepath, file_format, compression, "pickle", STEP_COLUMN_TYPES)
+    try:
+        for batch in logger.iter_steps(columns=columns, batch_size=batch_size, as_batches=True, **filters):
+            writer.write(batch)
+    finally:
+        number_of_rows = writer.close(columns)
+    return number_of_rows
+
+
+def export_episodes(logger, filepath, keys=None, file_format=None, compression="zstd", batch_size=10000, **filters):
+    """Streams the episode data of a GLogger into a Parquet or Arrow file (see GLogger.export_episodes).
+
+    Returns:
+        int: The number of exported episodes.
+    """
+    columns = ("episode_id",) + (tuple(keys) if keys is not None else ("episode_data",))
+    # The types of the keys are the SQLite types of all their stored values, not only of the first batch
+    column_types = logger.episode_key_types(keys) if keys is not None else {}
+    column_types["episode_id"] = "int64"
+    writer = BatchWriter(filepath, file_format, compression, "json", column_types)
+    batch = {column: [] for column in columns}
+    try:
+        for episode, episode_data in logger.iter_episodes(keys=keys, batch_size=batch_size, **filters):
+            batch["episode_id"].append(episode)
+            if keys is None:
+                batch["episode_data"].append(episode_data)
+            else:
+                for key in keys:
+                    batch[key].append(episode_data[key])
+            if len(batch["episode_id"]) >= batch_size:
+                writer.write(batch)
+                batch = {column: [] for column in columns}
+        if batch["episode_id"]:
+            writer.write(batch)
+    finally:
+        number_of_rows = writer.close(columns)
+    return number_of_rows
@@ -0,0 +1,95 @@
+import hashlib
+import pickle
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class Fingerprint(ABC):
+
+    def __init__(self):
+        """Base class of the fingerprints that GLogger stores next to the logged objects.
+
+        Calling a fingerprint returns the hash string of an object and measures the hashing cost
+        in calls and total_time (seconds).
+        """
+        self.calls = 0
+        self.total_time = 0.0
+
+    def __call__(self, obj):
+        start = time.perf_counter()
+        hashed = self.hash(obj)
+        self.total_time += time.perf_counter() - start
+        self.calls += 1
+        return hashed
+
+    @abstractmethod
+    def hash(self, obj):
+        """Override this method to return the hash string of obj."""
+
+    @property
+    def average_time(self):
+        """Average hashing time per call in seconds."""
+        return self.total_time / self.calls if self.calls else None
+
+    def reset_statistics(self):
+        """Resets the measured hashing cost."""
+        self.calls = 0
+        self.total_time = 0.0
+
+
+class PickleSha256Fingerprint(Fingerprint):
+
+    def hash(self, obj):
+        """SHA-256 of the pickled object (the original GLogger hash)."""
+        return hashlib.sha256(pickle.dumps(obj)).hexdigest()
+
+
+class ArrayFingerprint(Fingerprint):
+
+    def __init__(self, algorithm="blake2b", digest_size=8):
+        """Hashes NumPy arrays directly from their buffer, dtype and shape without pickling them.
+
+        Args:
+            algorithm (str): Name of a hashlib algorithm.
+            digest_size (int): Digest size in bytes, only used by blake2b and blake2s.
+        """
+        super().__init__()
+        self.algorithm = algorithm
+        self.digest_size = digest_size
+
+    def __new_hash(self):
+        if self.algorithm in ("blake2b", "blake2s"):
+            return hashlib.new(self.algorithm, digest_size=self.digest_size)
+        return hashlib.new(self.algorithm)
+
+    def hash(self, obj):
+        """Hash of the array buffer, dtype and shape, or of the pickled object for other types and for arrays
+        that hold Python objects (whose buffer only holds object addresses)."""
+        hashed = self.__new_hash()
+        if isinstance(obj, (np.ndarray, np.generic)) and not obj.dtype.hasobject:
+            hashed.update(obj.dtype.str.encode())
+            hashed.update(str(np.shape(obj)).encode())
+            hashed.update(np.ascontiguousarray(obj).data)
+        else:
+            hashed.update(pickle.dumps(obj))
+        return hashed.hexdigest()
+
+
+FINGERPRINTS = {
+    "sha256": PickleSha256Fingerprint,
+    "blake2b": ArrayFingerprint,
+}
+
+
+def get_fingerprint(fingerprint):
+    """Returns a fingerprint instance for a fingerprint name or instance.
+
+    Raises:
+        ValueError: If the fingerprint name is unknown.
+    """
+    if isinstance(fingerprint, Fingerprint):
+        return fingerprint
+    if fingerprint not in FINGERPRINTS:
+        raise ValueError(f"Unknown fingerprint {fingerprint}, use one of {list(FINGERPRINTS)} or a Fingerprint instance.")
+    return FINGERPRINTS[fingerprint]()
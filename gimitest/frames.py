@@ -0,0 +1,252 @@
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from gimitest.async_writer import AsyncWriter
+
+
+class FrameBuffer:
+
+    def __init__(self, capacity):
+        """Ring buffer of the last capacity rendered frames in one preallocated array.
+
+        The array is allocated when the first frame arrives (its shape and dtype are the ones of the frame),
+        afterwards every frame is copied into the next slot without allocating memory.
+
+        Args:
+            capacity (int): Number of kept frames.
+
+        Raises:
+            ValueError: If the capacity is not positive.
+        """
+        if capacity < 1:
+            raise ValueError(f"The capacity of the frame buffer must be positive, got {capacity}.")
+        self.capacity = capacity
+        self.array = None
+        self.index = 0
+        self.size = 0
+
+    def append(self, frame):
+        """Copies a frame into the buffer and overwrites the oldest frame if the buffer is full.
+
+        Raises:
+            ValueError: If the frame has another shape or dtype than the first frame.
+        """
+        if self.array is None:
+            self.array = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+        elif frame.shape != self.array.shape[1:] or frame.dtype != self.array.dtype:
+            raise ValueError(f"The frames must have the shape {self.array.shape[1:]} and dtype {self.array.dtype}, got {frame.shape} and {frame.dtype}.")
+        self.array[self.index] = frame
+        self.index = (self.index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def frames(self):
+        """Returns a copy of the kept frames from the oldest to the newest frame as one array."""
+        if self.size == 0:
+            return None
+        if self.size < self.capacity:
+            return self.array[:self.size].copy()
+        return np.concatenate((self.array[self.index:], self.array[:self.index]))
+
+    def clear(self):
+        """Forgets the kept frames, the array is reused."""
+        self.index = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+
+class FrameSink:
+
+    def __init__(self, queue_size=100, backpressure="block", sample_interval=10):
+        """Encodes and writes rendered frames on a writer thread, so that the environment loop does not wait for
+        the image encoding and the disk.
+
+        The frames are put on a bounded queue (see AsyncWriter); subclasses implement write_frame and write_episode,
+        which are called on the writer thread. The frames are numbered per episode, and end_episode() starts the
+        next episode. Frames must not be modified in place after they were put into the sink.
+
+        Args:
+            queue_size (int): Maximal number of queued frames.
+            backpressure (str): Policy for a full queue ("block", "drop_oldest" or "sample").
+            sample_interval (int): Only every sample_interval-th frame is kept by the "sample" policy while the queue is full.
+        """
+        self.episode = 0
+        self.frame_index = 0
+        self.writer = AsyncWriter(self.__write_records, queue_size, backpressure, sample_interval, name="FrameSinkWriter")
+
+    def put(self, frame):
+        """Queues a frame (NumPy array) of the current episode."""
+        self.writer.put(("frame", (self.episode, self.frame_index, frame)))
+        self.frame_index += 1
+
+    def end_episode(self):
+        """Ends the current episode (episodes without frames are skipped)."""
+        if self.frame_index == 0:
+            return
+        self.writer.put(("episode", self.episode), droppable=False)
+        self.episode += 1
+        self.frame_index = 0
+
+    def __write_records(self, records):
+        for kind, record in records:
+            if kind == "frame":
+                self.write_frame(*record)
+            else:
+                self.write_episode(record)
+
+    def write_frame(self, episode, frame_index, frame):
+        """Writes a frame (writer thread)."""
+        pass
+
+    def write_episode(self, episode):
+        """Finishes an episode whose frames were all written with write_frame (writer thread)."""
+        pass
+
+    @property
+    def dropped_frames(self):
+        """Number of frames dropped by the backpressure policy."""
+        return self.writer.dropped_records
+
+    def flush(self):
+        """Waits until the writer thread wrote all queued frames.
+
+        Raises:
+            Exception: The first exception that the writer thread raised while writing frames.
+        """
+        self.writer.join()
+
+    def close(self):
+        """Ends the current episode, writes all queued frames and stops the writer thread."""
+        self.end_episode()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class ImageSink(FrameSink):
+
+    def __init__(self, directory, image_format="png", **kwargs):
+        """Writes every frame as an image file directory/episode_<episode>_frame_<index>.<image_format>.
+
+        Args:
+            directory (str): Directory of the images.
+            image_format (str): File extension, which determines the PIL image format (e.g. "png" or "jpg").
+            **kwargs: Queue arguments of FrameSink.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.image_format = image_format
+        super().__init__(**kwargs)
+
+    def write_frame(self, episode, frame_index, frame):
+        Image.fromarray(frame).save(os.path.join(self.directory, f"episode_{episode:06d}_frame_{frame_index:06d}.{self.image_format}"))
+
+
+def save_gif(filepath, frames, duration):
+    """Writes frames as an animated GIF."""
+    images = [Image.fromarray(frame) for frame in frames]
+    images[0].save(filepath, save_all=True, append_images=images[1:], duration=duration, loop=0)
+
+
+def save_frame_arrays(filepath, frame_indices, frames, compressed):
+    """Writes frames and their indices as the arrays "frames" and "frame_indices" of an .npz file."""
+    save = np.savez_compressed if compressed else np.savez
+    save(filepath, frames=np.stack(frames), frame_indices=np.array(frame_indices))
+
+
+class EpisodeFrameSink(FrameSink, ABC):
+
+    def __init__(self, directory, processes=None, **kwargs):
+        """Collects the frames of an episode on the writer thread and writes them into one file when the episode ends.
+
+        Args:
+            directory (str): Directory of the episode files.
+            processes (int): If given, the episode files are encoded by a pool of this many processes, so that
+                encoders that hold the GIL (e.g. the GIF quantization) do not slow down the environment loop.
+            **kwargs: Queue arguments of FrameSink.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.frame_indices = []
+        self.frames = []
+        self.pool = ProcessPoolExecutor(processes) if processes else None
+        self.futures = []
+        super().__init__(**kwargs)
+
+    def write_frame(self, episode, frame_index, frame):
+        self.frame_indices.append(frame_index)
+        self.frames.append(frame)
+
+    def write_episode(self, episode):
+        frame_indices, frames = self.frame_indices, self.frames
+        self.frame_indices, self.frames = [], []
+        if not frames:
+            return
+        function, arguments = self.episode_writer(episode, frame_indices, frames)
+        if self.pool is None:
+            function(*arguments)
+        else:
+            self.futures.append(self.pool.submit(function, *arguments))
+
+    @abstractmethod
+    def episode_writer(self, episode, frame_indices, frames):
+        """Override this method to return the module-level function that writes the frames of an episode and its arguments."""
+
+    def __wait_for_pool(self):
+        futures = self.futures
+        self.futures = []
+        for future in futures:
+            future.result()
+
+    def flush(self):
+        super().flush()
+        self.__wait_for_pool()
+
+    def close(self):
+        super().close()
+        if self.pool is not None:
+            self.__wait_for_pool()
+            self.pool.shutdown()
+
+
+class GifSink(EpisodeFrameSink):
+
+    def __init__(self, directory, duration=50, **kwargs):
+        """Writes the frames of every episode as an animated GIF directory/episode_<episode>.gif.
+
+        Args:
+            directory (str): Directory of the GIFs.
+            duration (int): Display time of every frame in milliseconds.
+            **kwargs: Arguments of EpisodeFrameSink (processes) and FrameSink.
+        """
+        self.duration = duration
+        super().__init__(directory, **kwargs)
+
+    def episode_writer(self, episode, frame_indices, frames):
+        return save_gif, (os.path.join(self.directory, f"episode_{episode:06d}.gif"), frames, self.duration)
+
+
+class ArraySink(EpisodeFrameSink):
+
+    def __init__(self, directory, compressed=True, **kwargs):
+        """Writes the frames of every episode as one array file directory/episode_<episode>.npz with the
+        arrays "frames" (number of frames x frame shape) and "frame_indices".
+
+        Args:
+            directory (str): Directory of the array files.
+            compressed (bool): If True, the file is compressed with np.savez_compressed.
+            **kwargs: Arguments of EpisodeFrameSink (processes) and FrameSink.
+        """
+        self.compressed = compressed
+        super().__init__(directory, **kwargs)
+
+    def episode_writer(self, episode, frame_indices, frames):
+        return save_frame_arrays, (os.path.join(self.directory, f"episode_{episode:06d}.npz"), frame_indices, frames, self.compressed)
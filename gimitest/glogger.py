@@ -2,28 +2,316 @@ import sqlite3
 import json
 import pickle
 import time
-from collections import Counter
-import math
-from statistics import mean
 import os
 import hashlib
+import atexit
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
+from gimitest.async_writer import AsyncWriter
+from gimitest.fingerprint import get_fingerprint
+from gimitest.array_store import ArrayStore
+from gimitest.episode_statistics import EpisodeStatistics
+from gimitest.compression import get_codec
+from gimitest import export
 
 
+INSERT_STEP_QUERY = """
+    INSERT INTO steps (episode_id, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection, state_hash, action_hash, next_state_hash, reward_hash, reward_value) 
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+INSERT_EPISODE_QUERY = "INSERT OR IGNORE INTO episodes (id, episode_data) VALUES (?, ?)"
+INSERT_EPISODE_KEY_QUERY = "INSERT OR IGNORE INTO episode_keys (key, episode_id, value, json) VALUES (?, ?, ?, ?)"
+INSERT_AGENT_STEP_QUERY = "INSERT INTO agent_steps (episode_id, step, agent, reward, done, truncated) VALUES (?, ?, ?, ?, ?, ?)"
+# Keys that are read with one join each (SQLite joins at most 64 tables)
+MAX_JOINED_EPISODE_KEYS = 60
+# Number of recently stored observation hashes whose observations are not pickled again
+STORED_OBSERVATION_CACHE_SIZE = 100000
+
+STEP_COLUMNS = ("episode_id", "step", "state", "action", "next_state", "reward", "done", "truncated", "info", "step_data", "agent_selection", "state_hash", "action_hash", "next_state_hash", "reward_hash")
+PICKLED_STEP_COLUMNS = ("state", "action", "next_state", "reward", "info", "step_data", "agent_selection")
+ARRAY_STORE_COLUMNS = ("state", "action", "next_state", "reward")
+# Fields whose per-agent arrays are stacked into one array with agent_columns
+STACKED_AGENT_FIELDS = ("state", "action", "next_state")
+# Numeric copy of the reward that can be filtered in SQL
+QUERYABLE_STEP_COLUMNS = STEP_COLUMNS + ("reward_value",)
+HASHED_STEP_FIELDS = ("state", "action", "next_state", "reward")
+DEDUPLICATED_STEP_FIELDS = ("state", "next_state")
+FIELD_POLICIES = ("record", "hash", "downcast", "deduplicate", "skip")
+
+# SQLite settings of the GLogger connections and whether the analysis indexes are created
+PERFORMANCE_PROFILES = {
+    "default": {"pragmas": {}, "indexes": False},
+    "fast": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -65536,
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+        },
+        "indexes": True,
+    },
+}
+
+# Indexes for the queries of the library (failure lookups, reward filters, hash lookups).
+# Step counts per episode use the primary key.
+ANALYSIS_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS steps_done ON steps (episode_id, step) WHERE done = 1",
+    "CREATE INDEX IF NOT EXISTS steps_truncated ON steps (episode_id, step) WHERE truncated = 1",
+    "CREATE INDEX IF NOT EXISTS steps_reward_value ON steps (reward_value)",
+    "CREATE INDEX IF NOT EXISTS steps_state_hash ON steps (state_hash)",
+    "CREATE INDEX IF NOT EXISTS steps_next_state_hash ON steps (next_state_hash)",
+)
+
+
+def resolve_episode_keys(dictionary, resolved):
+    """Adds every (nested) key of the episode data with the value that a key lookup finds to resolved.
+
+    The keys of a dictionary take precedence over the keys of its nested dictionaries, which are searched in order.
+    """
+    for key, value in dictionary.items():
+        resolved.setdefault(str(key), value)
+    for value in dictionary.values():
+        if isinstance(value, dict):
+            resolve_episode_keys(value, resolved)
+    return resolved
+
+
+def json_default(value):
+    """Converts the NumPy values that tests store in the episode data (e.g. np.bool_, np.int64 or arrays) for json.dumps.
+
+    Raises:
+        TypeError: If the value can not be serialized.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_episode_data(episode_data):
+    """Returns the episode data as JSON text, or None if it can not be serialized (the episode is not stored)."""
+    try:
+        return json.dumps(episode_data, default=json_default)
+    except (TypeError, ValueError):
+        return None
+
+
+def episode_key_rows(episode, episode_data):
+    """Returns the rows of the episode_keys table of an episode. Numbers and strings are stored as typed
+    SQLite values, other values (booleans, lists and dictionaries) as JSON text. Values that can not be
+    serialized are left out."""
+    rows = []
+    for key, value in resolve_episode_keys(episode_data, {}).items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is None or isinstance(value, str) or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+            rows.append((key, episode, value, 0))
+        else:
+            try:
+                rows.append((key, episode, json.dumps(value, default=json_default), 1))
+            except (TypeError, ValueError):
+                pass
+    return rows
+
+
+class RecentHashes:
+
+    def __init__(self, max_size):
+        """Bounded set of the most recently used hashes (least recently used hashes are evicted)."""
+        self.max_size = max_size
+        self.hashes = OrderedDict()
+
+    def __contains__(self, value):
+        if value in self.hashes:
+            self.hashes.move_to_end(value)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def update(self, values):
+        hashes = self.hashes
+        for value in values:
+            hashes[value] = None
+            hashes.move_to_end(value)
+        while len(hashes) > self.max_size:
+            hashes.popitem(last=False)
+
+
+class StackedAgentValues:
+
+    __slots__ = ("agents", "values")
+
+    def __init__(self, agents, values):
+        """Per-agent arrays of the same shape and dtype, stored as one array whose first axis follows the agents."""
+        self.agents = agents
+        self.values = values
+
+    def __getstate__(self):
+        return self.agents, self.values
+
+    def __setstate__(self, state):
+        self.agents, self.values = state
+
+    def to_dict(self):
+        return dict(zip(self.agents, self.values))
+
+
+def stack_agent_values(value):
+    """Returns per-agent arrays of the same shape and dtype as StackedAgentValues, other values unchanged."""
+    if not isinstance(value, dict) or not value:
+        return value
+    arrays = list(value.values())
+    first = arrays[0]
+    if not isinstance(first, np.ndarray):
+        return value
+    if not all(isinstance(array, np.ndarray) and array.shape == first.shape and array.dtype == first.dtype for array in arrays):
+        return value
+    return StackedAgentValues(tuple(value), np.stack(arrays))
+
+
+def reduce_agent_values(reward, done, truncated):
+    """Sums up per-agent rewards and combines per-agent done and truncated flags (values of single-agent
+    environments are returned unchanged)."""
+    if isinstance(reward, dict):
+        reward = sum(reward.values())
+    if isinstance(done, dict):
+        done = all(done.values())
+    if isinstance(truncated, dict):
+        truncated = all(truncated.values())
+    return reward, done, truncated
+
+
+def downcast(value, dtype):
+    """Casts floating point arrays and scalars to dtype, other values are returned unchanged."""
+    if isinstance(value, StackedAgentValues):
+        return StackedAgentValues(value.agents, downcast(value.values, dtype))
+    if isinstance(value, np.ndarray) and value.dtype.kind == "f":
+        return value.astype(dtype)
+    if isinstance(value, (float, np.floating)):
+        return np.dtype(dtype).type(value)
+    return value
+
 
 class GLogger:
 
-    def __init__(self, db_path):
-        """Initializes the TestLogger object with the given database path."""
+    def __init__(self, db_path, buffer_size=None, asynchronous=False, queue_size=10000, backpressure="block", sample_interval=10, fingerprint="sha256", array_store=None, schema=None, retention=None, performance_profile="default", worker_id=None, statistics_quantiles=(0.5, 0.9, 0.99), compression=None, agent_columns=False):
+        """Initializes the TestLogger object with the given database path.
+
+        Args:
+            db_path (str): Path of the SQLite database.
+            buffer_size (int): If None, every step is written and committed immediately.
+                Otherwise, the logger keeps one connection open, collects the step rows in memory and
+                writes them in a single transaction every buffer_size steps (0 means only at episode end)
+                and whenever an episode is stored, flush() or close() is called.
+            asynchronous (bool): If True, step and episode records are put on a bounded queue and a
+                writer thread hashes, pickles and inserts them. The logged objects must not be modified
+                in place after they were passed to the logger. close() writes the queued records; it is
+                also called when the interpreter exits.
+            queue_size (int): Maximal number of queued step records in asynchronous mode.
+            backpressure (str): Policy for a full queue in asynchronous mode ("block", "drop_oldest" or "sample").
+                Episode records are never dropped.
+            sample_interval (int): Only every sample_interval-th step record is kept by the "sample" policy while the queue is full.
+            fingerprint (str or Fingerprint): Hash of the logged states, actions and rewards. "sha256" hashes the pickled
+                objects, "blake2b" hashes NumPy arrays directly with a small digest. The hashing cost is measured by
+                the fingerprint (self.fingerprint.calls, self.fingerprint.total_time).
+            array_store (str or ArrayStore): If given, states, actions, next states and rewards are written into
+                typed NumPy shards in this directory instead of pickled BLOBs, and the steps table only keeps the
+                remaining columns. Requires observations and actions of a fixed shape.
+            schema (dict): Logging policy per step field (state, action, next_state, reward, info, step_data,
+                agent_selection). "record" stores the value, "hash" only stores the hash (state, action,
+                next_state and reward), ("downcast", dtype) stores floating point values cast to dtype
+                (e.g. ("downcast", "float16")), "deduplicate" (state and next_state) stores every distinct
+                observation once in the observations table keyed by its hash, and "skip" stores nothing.
+                To skip pickling observations that were already stored, the logger keeps the hashes of the last
+                STORED_OBSERVATION_CACHE_SIZE stored observations in memory (about 200 bytes per SHA-256 hash,
+                20 MB in total); other observations are pickled again and skipped by the database.
+                Missing fields are recorded.
+                The schema is stored in the database; if no schema is given, the stored schema is used. The schema
+                of a database that has steps can not be changed.
+            retention (RetentionPolicy): If given, the steps of an episode are buffered and the policy decides which
+                of them are stored when the episode ends (see gimitest.retention). The episode data is always stored.
+                The logged objects must not be modified in place until the episode is stored.
+            performance_profile (str or dict): SQLite tuning. "default" keeps the SQLite defaults, "fast" enables WAL,
+                synchronous=NORMAL, a larger cache and memory-mapped I/O and creates the analysis indexes
+                (see create_indexes). A dict with "pragmas" and "indexes" defines a custom profile.
+            worker_id (int): If given, the logger writes its own shard (GLogger.shard_path(db_path, worker_id)), so that
+                parallel test workers do not share a database file. A string array store gets the same suffix.
+                The shards are combined with gimitest.shards.merge_shards.
+            statistics_quantiles (tuple): Quantiles of the step time in the episode summary (see gimitest.episode_statistics).
+                Further per-step aggregators can be registered with self.statistics.register(name, aggregator).
+            compression (dict): Codec per recorded or downcast step field ("zlib", "lzma", "delta" or a Codec, see
+                gimitest.compression), e.g. {"state": "delta", "next_state": "delta"}. The pickled values are compressed
+                before they are written and decompressed transparently when they are loaded. "delta" stores the
+                difference to the value of the previous stored step of the episode.
+                The codecs and their parameters are stored in the database; if no compression is given, the stored
+                codecs are used. The codecs of a database that has steps can not be changed.
+            agent_columns (bool): If True, the per-agent dictionaries of parallel multi-agent environments are stored
+                compactly: the rewards and done and truncated flags of every agent are written as typed rows into the
+                agent_steps table (the reward column is rebuilt from them when steps are loaded), and per-agent
+                observations and actions of the same shape are stacked into one array. Not supported with an array store.
+        """
+        if isinstance(performance_profile, str):
+            if performance_profile not in PERFORMANCE_PROFILES:
+                raise ValueError(f"Unknown performance profile {performance_profile}, use one of {list(PERFORMANCE_PROFILES)}.")
+            performance_profile = PERFORMANCE_PROFILES[performance_profile]
+        self.performance_profile = performance_profile
+        self.journal_mode_set = False
+        self.worker_id = worker_id
+        if worker_id is not None:
+            db_path = GLogger.shard_path(db_path, worker_id)
+            if isinstance(array_store, str):
+                array_store = GLogger.shard_path(array_store, worker_id)
         self.db_path = db_path
+        self.buffer_size = buffer_size
+        self.persistent = buffer_size is not None or asynchronous
+        self.conn = None
+        self.step_buffer = []
         self.init_db()
-        self.collected_reward = 0
-        self.collected_actions = []
-        self.times = []
+        if worker_id is not None:
+            with self.__connect() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS shard_info (worker_id INTEGER PRIMARY KEY)")
+                conn.execute("INSERT OR IGNORE INTO shard_info (worker_id) VALUES (?)", (worker_id,))
+        if isinstance(array_store, str):
+            array_store = ArrayStore(array_store)
+        self.array_store = array_store
+        # Deduplicated observations of the rows that are not written yet, by hash
+        self.observation_rows = {}
+        # Evicted observations are pickled again when they recur and ignored by INSERT OR IGNORE
+        self.stored_observation_hashes = RecentHashes(STORED_OBSERVATION_CACHE_SIZE)
+        self.schema = self.__init_schema(schema)
+        self.compression = self.__init_compression(compression)
+        self.delta_references = {}
+        if agent_columns and self.array_store is not None:
+            raise ValueError("Agent columns can not be stored in the array store.")
+        self.agent_columns = agent_columns
+        self.agent_rows = []
+        if self.performance_profile.get("indexes", False):
+            self.create_indexes()
+        self.writer = None
+        if asynchronous:
+            self.writer = AsyncWriter(self.__write_records, queue_size, backpressure, sample_interval)
+            # The writer thread is a daemon thread, the queued records are written when the interpreter exits
+            atexit.register(self.close)
+        self.statistics = EpisodeStatistics(statistics_quantiles)
+        self.fingerprint = get_fingerprint(fingerprint)
+        self.retention = retention
+        self.retained_records = None
         self.old_state = None
+        self.old_state_hash = None
         self.agent_selection = None
 
 
+    @staticmethod
+    def shard_path(path, worker_id):
+        """Returns the path of the shard of a worker."""
+        return f"{path}.worker{worker_id}"
+
     def pickle_to_hash_string(self, obj):
         # To pickle
         pickled = pickle.dumps(obj)
@@ -31,10 +319,148 @@ class GLogger:
         hashed = hashlib.sha256(pickled).hexdigest()
         # To string
         return hashed
+
+    def __open_connection(self, **kwargs):
+        """Opens a connection with the pragmas of the performance profile."""
+        conn = sqlite3.connect(self.db_path, **kwargs)
+        for pragma, value in self.performance_profile.get("pragmas", {}).items():
+            # The journal mode is stored in the database file and only needs to be set once
+            if pragma == "journal_mode" and self.journal_mode_set:
+                continue
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        self.journal_mode_set = True
+        return conn
+
+    def __connect(self):
+        """Returns the persistent connection in buffered or asynchronous mode, otherwise a new connection."""
+        if not self.persistent:
+            return self.__open_connection()
+        if self.conn is None:
+            # The writer thread and the caller never use the connection at the same time
+            self.conn = self.__open_connection(check_same_thread=False)
+        return self.conn
+
+    def __write_step_rows(self, conn, rows):
+        """Writes step rows, the new deduplicated observations they reference and their per-agent rows.
+
+        Returns:
+            list: Hashes of the written observations, which are stored once the transaction is committed.
+        """
+        observation_hashes = []
+        if self.observation_rows:
+            observation_rows = self.observation_rows
+            self.observation_rows = {}
+            conn.executemany("INSERT OR IGNORE INTO observations (hash, data) VALUES (?, ?)", observation_rows.items())
+            observation_hashes = list(observation_rows)
+        if self.agent_rows:
+            agent_rows = self.agent_rows
+            self.agent_rows = []
+            conn.executemany(INSERT_AGENT_STEP_QUERY, agent_rows)
+        conn.executemany(INSERT_STEP_QUERY, rows)
+        return observation_hashes
+
+    def __write_step_buffer(self, conn):
+        """Writes the buffered step rows with the given connection and empties the buffer.
+
+        Returns:
+            list: Hashes of the written observations (see __write_step_rows).
+        """
+        if self.step_buffer:
+            rows = self.step_buffer
+            self.step_buffer = []
+            return self.__write_step_rows(conn, rows)
+        return []
+
+    def __build_step_rows(self, records):
+        """Builds the rows of step records and skips the records that can not be encoded (e.g. unpicklable
+        values), so that one failing record does not roll back the others.
+
+        Returns:
+            tuple: The rows and the exception of the first skipped record (None if no record was skipped).
+        """
+        rows = []
+        error = None
+        for record in records:
+            number_of_agent_rows = len(self.agent_rows)
+            try:
+                rows.append(self.build_step_row(*record))
+            except Exception as e:
+                del self.agent_rows[number_of_agent_rows:]
+                if error is None:
+                    error = e
+        return rows, error
+
+    def __write_records(self, records):
+        """Builds and writes queued step and episode records in one transaction (writer thread).
+
+        Raises:
+            Exception: The exception of the first step record that could not be encoded, after the other records were written.
+        """
+        step_rows, error = self.__build_step_rows([record for kind, record in records if kind == "step"])
+        episode_rows = [record for kind, record in records if kind == "episode"]
+        with self.__connect() as conn:
+            observation_hashes = self.__write_step_rows(conn, step_rows)
+            conn.executemany(INSERT_EPISODE_QUERY, [(episode, episode_data) for episode, episode_data, _ in episode_rows
+                                                    if episode_data is not None])
+            conn.executemany(INSERT_EPISODE_KEY_QUERY, [row for _, _, key_rows in episode_rows for row in key_rows])
+        self.stored_observation_hashes.update(observation_hashes)
+        if self.array_store is not None:
+            for episode, _, _ in episode_rows:
+                self.array_store.flush(episode)
+        if error is not None:
+            raise error
+
+    @property
+    def dropped_records(self):
+        """Number of step records dropped by the backpressure policy in asynchronous mode."""
+        return self.writer.dropped_records if self.writer is not None else 0
+
+    def flush(self, wait=True):
+        """Writes all buffered step rows to the database in a single transaction.
+
+        In asynchronous mode, it waits until the writer thread wrote all queued records. With wait=False, it does
+        not wait (the queued episode records are the episode boundaries of the writer thread) and only raises the
+        exception of a failed write; the readers and close() always wait.
+        """
+        if self.writer is not None:
+            if not wait:
+                self.writer.raise_error()
+                return
+            self.writer.join()
+        if self.array_store is not None:
+            self.array_store.flush()
+        if not self.step_buffer:
+            return
+        with self.__connect() as conn:
+            observation_hashes = self.__write_step_buffer(conn)
+        self.stored_observation_hashes.update(observation_hashes)
+
+    def close(self):
+        """Flushes the buffered step rows, stops the writer thread and closes the persistent connection."""
+        # Steps of an unfinished episode are kept, since the retention policy cannot judge the episode
+        if self.retained_records:
+            records = self.retained_records
+            self.retained_records = None
+            for record in records:
+                self.__store_step_record(record)
+        if self.writer is not None:
+            atexit.unregister(self.close)
+            self.writer.close()
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
     
     def init_db(self):
         """Initializes the SQLite database and creates necessary tables."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.__connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''CREATE TABLE IF NOT EXISTS episodes (
                             id INTEGER PRIMARY KEY,
@@ -56,119 +482,384 @@ class GLogger:
                             action_hash TEXT,
                             next_state_hash TEXT,
                             reward_hash TEXT,
+                            reward_value REAL,
                             PRIMARY KEY (episode_id, step),
                             FOREIGN KEY (episode_id) REFERENCES episodes(id)
                         )''')
+            # Databases of older versions do not have the numeric reward column
+            step_columns = [row[1] for row in cursor.execute("PRAGMA table_info(steps)")]
+            if "reward_value" not in step_columns:
+                cursor.execute("ALTER TABLE steps ADD COLUMN reward_value REAL")
+            cursor.execute('''CREATE TABLE IF NOT EXISTS logging_schema (
+                            field TEXT PRIMARY KEY,
+                            policy TEXT
+                        )''')
+            cursor.execute('''CREATE TABLE IF NOT EXISTS observations (
+                            hash TEXT PRIMARY KEY,
+                            data BLOB
+                        )''')
+            # Flattened (nested) keys of the episode data for key lookups without parsing the JSON
+            has_episode_keys = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'episode_keys'").fetchone() is not None
+            cursor.execute('''CREATE TABLE IF NOT EXISTS episode_keys (
+                            key TEXT,
+                            episode_id INTEGER,
+                            value,
+                            json BOOLEAN,
+                            PRIMARY KEY (key, episode_id)
+                        ) WITHOUT ROWID''')
+            if not has_episode_keys:
+                # Databases of older versions only have the JSON episode data
+                for episode, episode_data in cursor.execute("SELECT id, episode_data FROM episodes").fetchall():
+                    try:
+                        cursor.executemany(INSERT_EPISODE_KEY_QUERY, episode_key_rows(episode, json.loads(episode_data)))
+                    except:
+                        pass
+            cursor.execute('''CREATE TABLE IF NOT EXISTS agent_steps (
+                            episode_id INTEGER,
+                            step INTEGER,
+                            agent TEXT,
+                            reward REAL,
+                            done BOOLEAN,
+                            truncated BOOLEAN,
+                            PRIMARY KEY (episode_id, step, agent)
+                        ) WITHOUT ROWID''')
+            cursor.execute('''CREATE TABLE IF NOT EXISTS field_compression (
+                            field TEXT PRIMARY KEY,
+                            codec TEXT,
+                            parameters TEXT
+                        )''')
+            # The codec parameters were not stored before
+            compression_columns = [row[1] for row in cursor.execute("PRAGMA table_info(field_compression)")]
+            if "parameters" not in compression_columns:
+                cursor.execute("ALTER TABLE field_compression ADD COLUMN parameters TEXT")
+
+    def __init_schema(self, schema):
+        """Validates the logging schema, stores it in the database and prepares the field encoders.
+
+        Raises:
+            ValueError: If the schema differs from the one of a database that already has steps.
+        """
+        stored_schema = self.load_schema()
+        if schema is None:
+            schema = stored_schema
+        normalized_schema = {}
+        for field in PICKLED_STEP_COLUMNS:
+            policy = schema.get(field, "record")
+            if isinstance(policy, (tuple, list)):
+                policy = list(policy)
+                if len(policy) != 2 or policy[0] != "downcast":
+                    raise ValueError(f"Invalid policy {policy} of {field}, use ('downcast', dtype).")
+                np.dtype(policy[1])
+            elif policy not in FIELD_POLICIES or policy == "downcast":
+                raise ValueError(f"Invalid policy {policy} of {field}, use one of {FIELD_POLICIES}.")
+            elif policy == "hash" and field not in HASHED_STEP_FIELDS:
+                raise ValueError(f"Only {HASHED_STEP_FIELDS} can be hashed.")
+            elif policy == "deduplicate" and field not in DEDUPLICATED_STEP_FIELDS:
+                raise ValueError(f"Only {DEDUPLICATED_STEP_FIELDS} can be deduplicated.")
+            elif policy == "deduplicate" and self.array_store is not None:
+                raise ValueError("Deduplicated fields can not be stored in the array store.")
+            normalized_schema[field] = policy
+        unknown_fields = [field for field in schema if field not in PICKLED_STEP_COLUMNS]
+        if unknown_fields:
+            raise ValueError(f"Unknown fields {unknown_fields} in the logging schema.")
+        self.deduplicated_fields = [field for field in DEDUPLICATED_STEP_FIELDS if normalized_schema[field] == "deduplicate"]
+        with self.__connect() as conn:
+            # The stored steps can only be loaded with the schema they were written with
+            if ({field: stored_schema.get(field, "record") for field in PICKLED_STEP_COLUMNS} != normalized_schema
+                    and conn.execute("SELECT 1 FROM steps LIMIT 1").fetchone() is not None):
+                raise ValueError(f"The database has steps that were logged with the schema {stored_schema}, "
+                                 "the schema of a database with steps can not be changed.")
+            conn.executemany("INSERT OR REPLACE INTO logging_schema (field, policy) VALUES (?, ?)",
+                             [(field, json.dumps(policy)) for field, policy in normalized_schema.items()])
+            for field in self.deduplicated_fields:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS steps_{field}_hash ON steps ({field}_hash)")
+
+        # Unrecorded fields have no encoder and cost nothing when a step is stored
+        self.hashed_fields = {field for field in HASHED_STEP_FIELDS if normalized_schema[field] != "skip"}
+        self.field_encoders = {}
+        self.array_converters = {}
+        for field, policy in normalized_schema.items():
+            if policy == "record":
+                self.field_encoders[field] = pickle.dumps
+                self.array_converters[field] = None
+            elif isinstance(policy, list):
+                dtype = np.dtype(policy[1])
+                self.field_encoders[field] = lambda value, dtype=dtype: pickle.dumps(downcast(value, dtype))
+                self.array_converters[field] = dtype
+            else:
+                self.field_encoders[field] = None
+        return normalized_schema
+
+    def load_schema(self):
+        """Returns the logging schema that is stored in the database (empty if none is stored)."""
+        with self.__connect() as conn:
+            rows = conn.execute("SELECT field, policy FROM logging_schema").fetchall()
+        return {field: json.loads(policy) for field, policy in rows}
+
+    def __init_compression(self, compression):
+        """Validates the codecs of the compressed fields and stores their names and parameters in the database.
+
+        Raises:
+            ValueError: If the codecs differ from the ones of a database that already has steps.
+        """
+        stored_compression = self.load_compression()
+        if compression is None:
+            compression = stored_compression
+        self.field_codecs = {}
+        for field, codec in compression.items():
+            if field not in PICKLED_STEP_COLUMNS:
+                raise ValueError(f"Unknown field {field} in the compression, use one of {PICKLED_STEP_COLUMNS}.")
+            policy = self.schema[field]
+            if policy != "record" and not isinstance(policy, list):
+                raise ValueError(f"Only recorded or downcast fields can be compressed, {field} has the policy {policy}.")
+            if self.array_store is not None and field in ARRAY_STORE_COLUMNS:
+                raise ValueError(f"{field} is stored in the array store and can not be compressed.")
+            self.field_codecs[field] = get_codec(codec)
+        rows = [(field, codec.name, json.dumps(codec.parameters(), sort_keys=True)) for field, codec in self.field_codecs.items()]
+        stored_rows = [(field, codec.name, json.dumps(codec.parameters(), sort_keys=True)) for field, codec in stored_compression.items()]
+        if sorted(rows) == sorted(stored_rows):
+            return {field: codec.name for field, codec in self.field_codecs.items()}
+        with self.__connect() as conn:
+            # The stored values can only be decoded with the codecs they were written with
+            if conn.execute("SELECT 1 FROM steps LIMIT 1").fetchone() is not None:
+                raise ValueError(f"The database has steps that were compressed with {dict((field, name) for field, name, _ in stored_rows)}, "
+                                 "the codecs of a database with steps can not be changed.")
+            conn.execute("DELETE FROM field_compression")
+            conn.executemany("INSERT INTO field_compression (field, codec, parameters) VALUES (?, ?, ?)", rows)
+        return {field: codec.name for field, codec in self.field_codecs.items()}
 
+    def load_compression(self):
+        """Returns the codecs of the compressed fields that are stored in the database, constructed with their
+        stored parameters (e.g. the keyframe interval of a delta codec)."""
+        with self.__connect() as conn:
+            rows = conn.execute("SELECT field, codec, parameters FROM field_compression").fetchall()
+        return {field: get_codec(codec, json.loads(parameters) if parameters else None) for field, codec, parameters in rows}
 
-    def __calculate_entropy(self, values):
-        """Calculates the entropy of a list of values."""
-        value_counts = Counter(values)
-        total_values = len(values)
-        entropy = 0.0
-        for count in value_counts.values():
-            probability = count / total_values
-            entropy -= probability * math.log2(probability)
-        return entropy
 
-    def __average_time_diff(self, timestamps):
-        """Calculates the average time difference between consecutive timestamps."""
-        time_diffs = [timestamps[i] - timestamps[i-1] for i in range(1, len(timestamps))]
-        return mean(time_diffs) if time_diffs else None
+    @property
+    def collected_reward(self):
+        """Reward collected in the current episode."""
+        return self.statistics.collected_reward
 
     def episode_storage(self, episode, episode_data, agent_selection):
         """Stores episode data in the database."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            episode_data["collected_reward"] = float(self.collected_reward)
-            try:
-                episode_data["entropy_of_actions"] = self.__calculate_entropy(self.collected_actions)
-                episode_data["number_of_unique_actions"] = len(set(self.collected_actions))
-            except Exception as e:
-                pass
-                #print("Error in episode storage", e)
-            episode_data["number_of_states"] = len(self.collected_actions) + 1
-            episode_data["avg_time_per_step"] = self.__average_time_diff(self.times)
-            try:
-                cursor.execute("INSERT INTO episodes (id, episode_data) VALUES (?, ?)",
-                            (episode, json.dumps(episode_data)))
-            except Exception as e:
-                pass
-                #print("Error in episode storage", e)
-            self.reset_episode_data()
+        episode_data.update(self.statistics.result())
+        if self.retention is not None:
+            self.__apply_retention(episode, episode_data)
+        key_rows = episode_key_rows(episode, episode_data)
+        episode_json = encode_episode_data(episode_data)
+        if self.writer is not None:
+            self.writer.put(("episode", (episode, episode_json, key_rows)), droppable=False)
+        else:
+            with self.__connect() as conn:
+                # Buffered steps are written in the same transaction as their episode
+                observation_hashes = self.__write_step_buffer(conn)
+                cursor = conn.cursor()
+                try:
+                    if episode_json is not None:
+                        cursor.execute("INSERT INTO episodes (id, episode_data) VALUES (?, ?)",
+                                    (episode, episode_json))
+                except Exception as e:
+                    pass
+                    #print("Error in episode storage", e)
+                cursor.executemany(INSERT_EPISODE_KEY_QUERY, key_rows)
+            self.stored_observation_hashes.update(observation_hashes)
+            if self.array_store is not None:
+                self.array_store.flush(episode)
+        self.reset_episode_data()
 
+    def __apply_retention(self, episode, episode_data):
+        """Stores the retained steps of the episode if the retention policy keeps the episode."""
+        records = self.retained_records
+        if records is None:
+            # The episode was already stored
+            return
+        self.retained_records = None
+        keep_episode = self.retention.keep_episode(episode, episode_data)
+        episode_data["number_of_retained_steps"] = len(records) if keep_episode else 0
+        if not keep_episode:
+            return
+        if self.writer is not None:
+            for record in records:
+                self.writer.put(("step", record))
+        else:
+            # Written in the same transaction as the episode
+            self.step_buffer.extend(self.build_step_row(*record) for record in records)
 
 
-    def step_storage(self, episode, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection):
-        current_time = time.time()
-        self.times.append(current_time)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            state_hash = self.pickle_to_hash_string(state)
-            action_hash = self.pickle_to_hash_string(action)
-            next_state_hash = self.pickle_to_hash_string(next_state)
-            reward_hash = self.pickle_to_hash_string(reward)
-    
 
-            step_data_blob = {
-                "state": state,
-                "action": action,
-                "next_state": next_state,
-                "reward": reward,
-                "done": done,
-                "truncated": truncated,
-                "info": info,
-                "custom_data": step_data,
-                "agent_selection": agent_selection
-            }
-            # Check if reward is from type defaultdict
-            try:
-                # Sum up all rewards
-                reward = sum(reward.values())
-            except:
-                pass
-            # Check if all dones are True
-            try:
-                done = all(done.values())
-            except:
-                pass
-            try:
-                truncated = all(truncated.values())
-            except:
-                pass
-            cursor.execute("""
-                INSERT INTO steps (episode_id, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection, state_hash, action_hash, next_state_hash, reward_hash) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    episode, step, pickle.dumps(state), pickle.dumps(action), pickle.dumps(next_state), pickle.dumps(reward), done, truncated, pickle.dumps(info), pickle.dumps(step_data), pickle.dumps(agent_selection), state_hash, action_hash, next_state_hash, reward_hash
-                )
-            )
+    def build_step_row(self, episode, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection):
+        """Hashes and encodes a step into a row of the steps table according to the logging schema."""
+        hashed_fields = self.hashed_fields
+        state_hash = action_hash = next_state_hash = reward_hash = None
+        if "state" in hashed_fields:
+            # The state is usually the next state of the previous step
+            if state is not None and state is self.old_state:
+                state_hash = self.old_state_hash
+            else:
+                state_hash = self.fingerprint(state)
+        if "action" in hashed_fields:
+            action_hash = self.fingerprint(action)
+        if "next_state" in hashed_fields:
+            next_state_hash = self.fingerprint(next_state)
+            self.old_state = next_state
+            self.old_state_hash = next_state_hash
+        if "reward" in hashed_fields:
+            reward_hash = self.fingerprint(reward)
+        if self.deduplicated_fields:
+            # Only observations that were not stored or queued before are pickled
+            observation_rows = self.observation_rows
+            if "state" in self.deduplicated_fields and state_hash not in observation_rows and state_hash not in self.stored_observation_hashes:
+                observation_rows[state_hash] = pickle.dumps(state)
+            if "next_state" in self.deduplicated_fields and next_state_hash not in observation_rows and next_state_hash not in self.stored_observation_hashes:
+                observation_rows[next_state_hash] = pickle.dumps(next_state)
 
-            self.collected_actions.append(action)
+        if self.agent_columns and isinstance(reward, dict):
+            # One typed row per agent instead of a pickled reward dictionary
+            record_rewards = self.field_encoders["reward"] is not None
+            self.agent_rows.extend(
+                (episode, step, str(agent), float(agent_reward) if record_rewards else None,
+                 done.get(agent) if isinstance(done, dict) else None,
+                 truncated.get(agent) if isinstance(truncated, dict) else None)
+                for agent, agent_reward in reward.items()
+            )
+            reward, done, truncated = reduce_agent_values(reward, done, truncated)
+            reward_value = float(reward)
+            reward = None
+        else:
+            reward, done, truncated = reduce_agent_values(reward, done, truncated)
             try:
-                self.collected_reward += reward
+                reward_value = float(reward)
             except:
-                pass
+                reward_value = None
+        if self.agent_columns:
+            state, action, next_state = stack_agent_values(state), stack_agent_values(action), stack_agent_values(next_state)
+        encoders = self.field_encoders
+        if self.array_store is not None:
+            values = {"state": state, "action": action, "next_state": next_state, "reward": reward}
+            self.array_store.append(episode, step, {
+                field: value if self.array_converters[field] is None else downcast(value, self.array_converters[field])
+                for field, value in values.items() if field in self.array_converters
+            })
+            state = action = next_state = reward = None
+        else:
+            state = encoders["state"](state) if encoders["state"] is not None else None
+            action = encoders["action"](action) if encoders["action"] is not None else None
+            next_state = encoders["next_state"](next_state) if encoders["next_state"] is not None else None
+            reward = encoders["reward"](reward) if encoders["reward"] is not None and reward is not None else None
+        info = encoders["info"](info) if encoders["info"] is not None else None
+        step_data = encoders["step_data"](step_data) if encoders["step_data"] is not None else None
+        agent_selection = encoders["agent_selection"](agent_selection) if encoders["agent_selection"] is not None else None
+        if self.field_codecs:
+            state, action, next_state, reward, info, step_data, agent_selection = self.__compress_fields(
+                episode, step, (state, action, next_state, reward, info, step_data, agent_selection))
+        return (
+            episode, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection,
+            state_hash, action_hash, next_state_hash, reward_hash, reward_value
+        )
+
+    def __compress_fields(self, episode, step, values):
+        """Compresses the pickled values of the step fields (in the order of PICKLED_STEP_COLUMNS)."""
+        compressed = []
+        for field, data in zip(PICKLED_STEP_COLUMNS, values):
+            codec = self.field_codecs.get(field)
+            if codec is None or data is None:
+                compressed.append(data)
+                continue
+            keyframe_interval = getattr(codec, "keyframe_interval", None)
+            if keyframe_interval is None:
+                compressed.append(codec.encode(data))
+                continue
+            # Delta codecs reference the previous stored value of the field in the same episode
+            reference = self.delta_references.get(field)
+            if reference is not None and reference[0] == episode and reference[3] + 1 < keyframe_interval:
+                payload = codec.encode(data, reference[1], reference[2])
+            else:
+                payload = codec.encode(data)
+            distance = reference[3] + 1 if codec.reference_step(payload) is not None else 0
+            self.delta_references[field] = (episode, step, data, distance)
+            compressed.append(payload)
+        return compressed
+
+    def step_storage(self, episode, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection):
+        current_time = time.perf_counter()
+
+        record = (episode, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection)
+        if self.retention is not None:
+            if self.retained_records is None:
+                self.retained_records = self.retention.create_buffer()
+            _, episode_done, episode_truncated = reduce_agent_values(reward, done, truncated)
+            if self.retention.keep_step(step, episode_done, episode_truncated):
+                self.retained_records.append(record)
+        else:
+            self.__store_step_record(record)
+
+        # Sum up the rewards of all agents
+        summed_reward = sum(reward.values()) if isinstance(reward, dict) else reward
+        self.statistics.update(record, summed_reward, current_time)
+
+    def __store_step_record(self, record):
+        """Writes a step record according to the write mode (direct, buffered or asynchronous)."""
+        if self.writer is not None:
+            self.writer.put(("step", record))
+        elif self.buffer_size is None:
+            row = self.build_step_row(*record)
+            with self.__connect() as conn:
+                observation_hashes = self.__write_step_rows(conn, [row])
+            self.stored_observation_hashes.update(observation_hashes)
+        else:
+            self.step_buffer.append(self.build_step_row(*record))
+            if 0 < self.buffer_size <= len(self.step_buffer):
+                self.flush()
 
     def delete_episode_step(self, episode, step):
-        """Deletes a specific step from the database."""
-        with sqlite3.connect(self.db_path) as conn:
+        """Deletes a specific step from the database.
+
+        Values of delta compressed fields that reference the deleted step can not be decoded anymore.
+        """
+        self.flush()
+        with self.__connect() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM steps WHERE episode_id = ? AND step = ?", (episode, step))
+            cursor.execute("DELETE FROM agent_steps WHERE episode_id = ? AND step = ?", (episode, step))
         
         
 
 
+    def discard_steps(self, episode, step, last_episode=None):
+        """Deletes the steps that were logged from step of episode on, up to the end of last_episode (default: episode),
+        and the stored episode data of these episodes, so that they can be logged again (e.g. by the continuation
+        of a restored snapshot, see GTestDecorator.decorate_with_logger).
+        """
+        if last_episode is None:
+            last_episode = episode
+        if self.retained_records:
+            records = [record for record in self.retained_records if (record[0], record[1]) < (episode, step)]
+            self.retained_records = self.retention.create_buffer()
+            self.retained_records.extend(records)
+        self.flush()
+        with self.__connect() as conn:
+            for table in ("steps", "agent_steps"):
+                conn.execute(f"DELETE FROM {table} WHERE (episode_id = ? AND step >= ?) OR (episode_id > ? AND episode_id <= ?)",
+                             (episode, step, episode, last_episode))
+            conn.execute("DELETE FROM episodes WHERE id BETWEEN ? AND ?", (episode, last_episode))
+            conn.execute("DELETE FROM episode_keys WHERE episode_id BETWEEN ? AND ?", (episode, last_episode))
+        if self.array_store is not None:
+            self.array_store.truncate(episode, step)
+            for later_episode in range(episode + 1, last_episode + 1):
+                self.array_store.truncate(later_episode, 0)
+        # The next value of a delta compressed field is a keyframe if the value it would reference was deleted
+        self.delta_references = {field: reference for field, reference in self.delta_references.items()
+                                 if (reference[0], reference[1]) < (episode, step)}
+
     def reset_episode_data(self):
         """Resets the collected data for a new episode."""
-        self.collected_reward = 0
-        self.collected_actions = []
-        self.times = []
+        self.statistics.reset()
 
     def load_episode(self, episode):
         """Loads and returns the metadata for a specific episode."""
-        with sqlite3.connect(self.db_path) as conn:
+        self.flush()
+        with self.__connect() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT episode_data FROM episodes WHERE id = ?", (episode,))
             row = cursor.fetchone()
@@ -176,48 +867,236 @@ class GLogger:
 
     def load_episode_step(self, episode, step):
         """Loads and returns the data for a specific step of an episode."""
-        with sqlite3.connect(self.db_path) as conn:
+        self.flush()
+        with self.__connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT episode_id, step, state, action, next_state, reward, done, truncated, info, step_data, agent_selection, state_hash, action_hash, next_state_hash, reward_hash FROM steps WHERE episode_id = ? AND step = ?", (episode, step))
+            cursor.execute(f"SELECT {', '.join(STEP_COLUMNS)} FROM steps WHERE episode_id = ? AND step = ?", (episode, step))
             row = cursor.fetchone()
             if row is None:
                 return None
-            data_dict = {}
-            data_dict["episode_id"] = row[0]
-            data_dict["step"] = row[1]
-            data_dict["state"] = pickle.loads(row[2])
-            data_dict["action"] = pickle.loads(row[3])
-            data_dict["next_state"] = pickle.loads(row[4])
-            data_dict["reward"] = pickle.loads(row[5])
-            data_dict["done"] = row[6]
-            data_dict["truncated"] = row[7]
-            data_dict["info"] = pickle.loads(row[8])
-            data_dict["step_data"] = pickle.loads(row[9])
-            data_dict["agent_selection"] = pickle.loads(row[10])
-            data_dict["state_hash"] = row[11]
-            data_dict["action_hash"] = row[12]
-            data_dict["next_state_hash"] = row[13]
-            data_dict["reward_hash"] = row[14]
-            return data_dict
+        columns = self.decode_step_rows([row], STEP_COLUMNS)
+        return {column: values[0] for column, values in columns.items()}
+
+    def decode_step_rows(self, rows, columns, cache=None):
+        """Decodes a batch of rows of the steps table column by column.
+
+        Args:
+            rows (list): Rows of the steps table with the given columns.
+            columns (tuple): Selected columns, must contain episode_id and step if an array store, a delta codec or agent columns are used.
+            cache (dict): Keeps the arrays of the last episode and the last delta decoded values between consecutive batches.
+
+        Returns:
+            dict: Column name to the list of decoded values.
+        """
+        if cache is None:
+            cache = {}
+        decoded = {}
+        loads = pickle.loads
+        keys = None
+        if "episode_id" in columns and "step" in columns:
+            keys = [(row[columns.index("episode_id")], row[columns.index("step")]) for row in rows]
+        for i, column in enumerate(columns):
+            values = [row[i] for row in rows]
+            if column in PICKLED_STEP_COLUMNS:
+                if column in self.field_codecs:
+                    values = self.__decompress_values(column, values, keys, cache.setdefault("references", {}))
+                # The BLOBs are NULL if the values are stored in the array store
+                values = [loads(value) if value is not None else None for value in values]
+                if column in STACKED_AGENT_FIELDS:
+                    values = [value.to_dict() if isinstance(value, StackedAgentValues) else value for value in values]
+            decoded[column] = values
+        if "reward" in decoded and keys is not None and None in decoded["reward"]:
+            self.__fill_agent_rewards(decoded["reward"], keys)
+        if self.deduplicated_fields:
+            self.__fill_deduplicated_observations(decoded)
+        if self.array_store is not None:
+            self.__fill_from_array_store(decoded, cache.setdefault("arrays", {}))
+        return decoded
+
+    def __decompress_values(self, field, payloads, keys, references):
+        """Returns the pickled bytes of the compressed values of a field.
+
+        Args:
+            field (str): Compressed field.
+            payloads (list): Compressed values (None for NULL).
+            keys (list): (episode, step) of every value, needed for delta codecs.
+            references (dict): Field to (episode, step, pickled bytes) of the last decoded value.
+
+        Raises:
+            ValueError: If a delta reference is missing.
+        """
+        codec = self.field_codecs[field]
+        values = []
+        for i, payload in enumerate(payloads):
+            if payload is None:
+                values.append(None)
+                continue
+            reference_step = codec.reference_step(payload)
+            if reference_step is None:
+                data = codec.decode(payload)
+            else:
+                if keys is None:
+                    raise ValueError(f"Delta compressed {field} values need the episode_id and step columns.")
+                episode = keys[i][0]
+                reference = references.get(field)
+                # Rows in episode/step order reference the previous row, other rows load their reference chain
+                if reference is not None and reference[0] == episode and reference[1] == reference_step:
+                    data = codec.decode(payload, reference[2])
+                else:
+                    data = codec.decode(payload, self.__load_delta_reference(field, episode, reference_step))
+            if keys is not None:
+                references[field] = (keys[i][0], keys[i][1], data)
+            values.append(data)
+        return values
+
+    def __load_delta_reference(self, field, episode, step):
+        """Decodes the pickled bytes of a delta compressed value from its keyframe."""
+        codec = self.field_codecs[field]
+        conn = self.__connect()
+        try:
+            # The reference chain is at most one keyframe interval long and is read with one query
+            rows = conn.execute(f"SELECT step, {field} FROM steps WHERE episode_id = ? AND step <= ? ORDER BY step DESC LIMIT ?",
+                                (episode, step, getattr(codec, "keyframe_interval", 1))).fetchall()
+        finally:
+            if not self.persistent:
+                conn.close()
+        stored_payloads = dict(rows)
+        payloads = []
+        while step is not None:
+            if stored_payloads.get(step) is None:
+                raise ValueError(f"The reference step {step} of {field} in episode {episode} is missing.")
+            payloads.append(stored_payloads[step])
+            step = codec.reference_step(stored_payloads[step])
+        data = None
+        for payload in reversed(payloads):
+            data = codec.decode(payload, data)
+        return data
+
+    def __fill_agent_rewards(self, rewards, keys):
+        """Replaces the missing rewards of decoded step rows with the per-agent rewards of the agent_steps table."""
+        step_ranges = {}
+        for (episode, step), reward in zip(keys, rewards):
+            if reward is None:
+                first, last = step_ranges.get(episode, (step, step))
+                step_ranges[episode] = (min(first, step), max(last, step))
+        agent_rewards = {}
+        conn = self.__connect()
+        try:
+            # Rewards of loggers without agent columns are not recorded
+            if conn.execute("SELECT 1 FROM agent_steps LIMIT 1").fetchone() is None:
+                return
+            # One range query on the primary key per episode of the batch
+            for episode, (first, last) in step_ranges.items():
+                rows = conn.execute("SELECT step, agent, reward FROM agent_steps WHERE episode_id = ? AND step >= ? AND step <= ?",
+                                    (episode, first, last))
+                for step, agent, reward in rows:
+                    agent_rewards.setdefault((episode, step), {})[agent] = reward
+        finally:
+            if not self.persistent:
+                conn.close()
+        for i, key in enumerate(keys):
+            if rewards[i] is None:
+                rewards[i] = agent_rewards.get(key)
+
+    def __fill_deduplicated_observations(self, decoded):
+        """Replaces the deduplicated observations of decoded step rows with the observations they reference."""
+        fields = [field for field in self.deduplicated_fields if field in decoded and f"{field}_hash" in decoded]
+        hashes = list({value_hash for field in fields for value_hash in decoded[f"{field}_hash"] if value_hash is not None})
+        if not hashes:
+            return
+        observations = {}
+        conn = self.__connect()
+        try:
+            # Stay below the maximal number of SQL variables
+            for i in range(0, len(hashes), 900):
+                chunk = hashes[i:i + 900]
+                rows = conn.execute(f"SELECT hash, data FROM observations WHERE hash IN ({', '.join('?' * len(chunk))})", chunk)
+                observations.update((value_hash, pickle.loads(data)) for value_hash, data in rows)
+        finally:
+            if not self.persistent:
+                conn.close()
+        for field in fields:
+            decoded[field] = [observations.get(value_hash) for value_hash in decoded[f"{field}_hash"]]
+
+    def __fill_from_array_store(self, decoded, array_cache):
+        """Replaces the missing array values of decoded step rows with the values of the array store."""
+        fields = [field for field in ARRAY_STORE_COLUMNS if field in decoded]
+        if not fields:
+            return
+        for i, (episode, step) in enumerate(zip(decoded["episode_id"], decoded["step"])):
+            if array_cache.get("episode") != episode:
+                steps = self.array_store.load_episode("step", episode)
+                array_cache.clear()
+                array_cache["episode"] = episode
+                array_cache["index"] = {} if steps is None else {s: index for index, s in enumerate(steps.tolist())}
+                for field in fields:
+                    array_cache[field] = self.array_store.load_episode(field, episode)
+            index = array_cache["index"].get(step)
+            if index is None:
+                continue
+            for field in fields:
+                # Fields that are not recorded have no shards
+                if array_cache[field] is not None:
+                    decoded[field][i] = array_cache[field][index]
+
+    def load_array(self, field, episodes=None, mmap_mode=None):
+        """Loads a field ("state", "action", "next_state", "reward" or "step") of several episodes
+        (default: all) from the array store as one contiguous array.
+
+        Raises:
+            ValueError: If the logger has no array store.
+        """
+        if self.array_store is None:
+            raise ValueError("The logger has no array store.")
+        self.flush()
+        return self.array_store.load(field, episodes, mmap_mode)
 
     def count_episodes(self):
         """Returns the total number of episodes stored in the database."""
-        with sqlite3.connect(self.db_path) as conn:
+        self.flush()
+        with self.__connect() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM episodes")
             return cursor.fetchone()[0]
 
     def count_episode_steps(self, episode):
         """Returns the number of steps in a specified episode."""
-        with sqlite3.connect(self.db_path) as conn:
+        self.flush()
+        with self.__connect() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM steps WHERE episode_id = ?", (episode,))
             return cursor.fetchone()[0]
 
+    def create_indexes(self):
+        """Creates the indexes for failure lookups, reward filters and hash lookups.
+
+        The indexes slow down inserts a bit; for large campaigns they can also be created once after the campaign.
+        """
+        with self.__connect() as conn:
+            for query in ANALYSIS_INDEXES:
+                conn.execute(query)
+
+    def count_distinct_states(self):
+        """Returns the number of distinct states (by hash) that were visited in all logged steps."""
+        self.flush()
+        with self.__connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM (SELECT state_hash AS hash FROM steps UNION SELECT next_state_hash FROM steps) WHERE hash IS NOT NULL")
+            return cursor.fetchone()[0]
+
     def delete_database(self):
         """Deletes the SQLite database file."""
-        if os.path.exists(self.db_path):
-            os.remove(self.db_path)
+        self.step_buffer = []
+        if self.writer is not None:
+            atexit.unregister(self.close)
+            self.writer.close()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        # The fast performance profile leaves WAL journal files
+        for path in (self.db_path, self.db_path + "-wal", self.db_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
 
     def own_episode_storage(self, episode, episode_data, agent_selection):
         """
@@ -231,33 +1110,21 @@ class GLogger:
         """
         pass
 
-    def __find_value_of_key_in_dictionary(self, dictionary, key):
-        if key in dictionary:
-            return dictionary[key]
-        else:
-            for k, v in dictionary.items():
-                if isinstance(v, dict):
-                    item = self.__find_value_of_key_in_dictionary(v, key)
-                    if item is not None:
-                        return item
-
-
     def create_episode_dataset(self, keys, filepath=None, start_episode=0, end_episode=None):
+        """Creates a DataFrame with the values of the given (nested) keys of the episode data.
+
+        The values of all episodes in [start_episode, end_episode) are read with a single query on the
+        flattened episode keys, so the JSON episode data is not parsed.
+        """
+        self.flush()
         if end_episode is None:
             end_episode = self.count_episodes()
-        data = []
+        columns = {key: [] for key in keys}
+        for _, values in self.iter_episodes(keys=keys, start_episode=start_episode, end_episode=end_episode, batch_size=10000):
+            for key in columns:
+                columns[key].append(values[str(key)])
 
-        for episode in range(start_episode, end_episode):
-            try:
-                episode_dict = self.load_episode(episode)
-                episode_data = {key: self.__find_value_of_key_in_dictionary(episode_dict, key) for key in keys}
-                data.append(episode_data)
-            except Exception as e:
-                print(f"Error in episode {episode}: {e}")
-                continue
-
-        # Convert the list of dictionaries to a Pandas DataFrame
-        dataset = pd.DataFrame(data)
+        dataset = pd.DataFrame(columns)
 
         # Optionally save the dataset to a file (e.g., as a CSV file)
         if filepath:
@@ -265,31 +1132,219 @@ class GLogger:
 
         return dataset
 
-    def create_step_dataset(self, filepath=None, start_episode=0, end_episode=None, start_step=0, end_step=None):
+    def create_step_dataset(self, filepath=None, start_episode=0, end_episode=None, start_step=0, end_step=None, batch_size=10000):
+        """Creates a DataFrame with the steps of the episodes in [start_episode, end_episode) and
+        the steps in [start_step, end_step) (default: until the episode end).
+
+        The steps are streamed in episode/step order through one cursor and decoded in batches of batch_size rows.
+        """
         if end_episode is None:
             end_episode = self.count_episodes()
-        if end_step is None:
-            until_episode_end = True
-        data = []
-
-        for episode in range(start_episode, end_episode):
-            if until_episode_end:
-                end_step = self.count_episode_steps(episode)
-            for step in range(start_step, end_step):
-                try:
-                    #print(episode, step, end_step)
-                    step_dict = self.load_episode_step(episode, step)
-                    #print(step_dict)
-                    data.append(step_dict)
-                except Exception as e:
-                    print(f"Error in episode {episode}, step {step}: {e}")
-                    continue
+        columns = {column: [] for column in STEP_COLUMNS}
+        for batch in self.iter_steps(start_episode=start_episode, end_episode=end_episode, start_step=start_step, end_step=end_step,
+                                     batch_size=batch_size, as_batches=True):
+            for column, values in batch.items():
+                columns[column].extend(values)
 
-        # Convert the list of dictionaries to a Pandas DataFrame
-        dataset = pd.DataFrame(data)
+        dataset = pd.DataFrame(columns)
 
         # Optionally save the dataset to a file (e.g., as a CSV file)
         if filepath:
             dataset.to_csv(filepath, index=False)
 
-        return dataset
\ No newline at end of file
+        return dataset
+
+    def export_steps(self, filepath, columns=STEP_COLUMNS, file_format=None, compression="zstd", batch_size=10000, **filters):
+        """Exports the logged steps into a Parquet or Arrow IPC file (requires pyarrow).
+
+        The steps are streamed from SQLite with iter_steps, so the table is never loaded as a whole, and every batch
+        becomes one row group. NumPy observations and actions of a fixed shape become fixed-size list columns
+        (their shape is stored in the field metadata "gimitest.shape"), numbers and strings typed columns, and other
+        values (e.g. info dictionaries) pickled binary columns.
+
+        Args:
+            filepath (str): Path of the file.
+            columns (tuple): Exported columns (see QUERYABLE_STEP_COLUMNS).
+            file_format (str): "parquet" or "arrow" (default: "arrow" for .arrow, .feather and .ipc files, otherwise "parquet").
+            compression (str): Compression codec of the file (e.g. "zstd", "snappy" or None).
+            batch_size (int): Number of steps per batch.
+            **filters: Filters of iter_steps (start_episode, end_episode, start_step, end_step, done, truncated, min_reward, max_reward).
+
+        Returns:
+            int: The number of exported steps.
+        """
+        return export.export_steps(self, filepath, columns, file_format, compression, batch_size, **filters)
+
+    def export_episodes(self, filepath, keys=None, file_format=None, compression="zstd", batch_size=10000, **filters):
+        """Exports the episode data into a Parquet or Arrow IPC file (requires pyarrow).
+
+        With keys, the file has one typed column per (nested) key, otherwise the episode data is stored as JSON text.
+        Nested values are stored as JSON text, too.
+
+        Args:
+            filepath (str): Path of the file.
+            keys (list): Exported (nested) keys of the episode data.
+            file_format (str): "parquet" or "arrow" (default: "arrow" for .arrow, .feather and .ipc files, otherwise "parquet").
+            compression (str): Compression codec of the file (e.g. "zstd", "snappy" or None).
+            batch_size (int): Number of episodes per batch.
+            **filters: Filters of iter_episodes (start_episode, end_episode, done, truncated, min_reward, max_reward).
+
+        Returns:
+            int: The number of exported episodes.
+        """
+        return export.export_episodes(self, filepath, keys, file_format, compression, batch_size, **filters)
+
+    def __iterate_rows(self, query, parameters, batch_size):
+        """Yields the rows of a query in batches of at most batch_size rows."""
+        self.flush()
+        conn = self.__connect()
+        try:
+            cursor = conn.execute(query, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            if not self.persistent:
+                conn.close()
+
+    def iter_steps(self, columns=STEP_COLUMNS, start_episode=0, end_episode=None, start_step=0, end_step=None,
+                   done=None, truncated=None, min_reward=None, max_reward=None, batch_size=1000, as_batches=False):
+        """Yields the logged steps in episode/step order with bounded memory.
+
+        The filters are evaluated by SQLite, and only the selected columns are read and deserialized.
+
+        Args:
+            columns (tuple): Columns of the steps table to load (see QUERYABLE_STEP_COLUMNS).
+            start_episode (int): First episode.
+            end_episode (int): Episode after the last episode (default: no limit).
+            start_step (int): First step of every episode.
+            end_step (int): Step after the last step of every episode (default: until the episode end).
+            done (bool): If given, only steps with this done flag.
+            truncated (bool): If given, only steps with this truncated flag.
+            min_reward (float): If given, only steps with at least this (summed up) reward.
+            max_reward (float): If given, only steps with at most this (summed up) reward.
+            batch_size (int): Number of rows that are fetched and decoded at once.
+            as_batches (bool): If True, yields dictionaries of column lists with up to batch_size steps
+                instead of one dictionary per step.
+
+        Raises:
+            ValueError: If a column does not exist.
+        """
+        unknown_columns = [column for column in columns if column not in QUERYABLE_STEP_COLUMNS]
+        if unknown_columns:
+            raise ValueError(f"Unknown step columns {unknown_columns}.")
+        columns = tuple(columns)
+        # The array store needs the episode and step of every row
+        selected_columns = columns
+        if self.array_store is not None:
+            selected_columns += tuple(column for column in ("episode_id", "step") if column not in selected_columns)
+        # Delta compressed values reference the previous step of their episode
+        if any(column in self.field_codecs for column in columns):
+            selected_columns += tuple(column for column in ("episode_id", "step") if column not in selected_columns)
+        # Per-agent rewards are read from the agent_steps table
+        if "reward" in columns:
+            selected_columns += tuple(column for column in ("episode_id", "step") if column not in selected_columns)
+        # Deduplicated observations are referenced by their hash
+        for field in self.deduplicated_fields:
+            if field in columns and f"{field}_hash" not in selected_columns:
+                selected_columns += (f"{field}_hash",)
+        conditions = ["episode_id >= ?", "step >= ?"]
+        parameters = [start_episode, start_step]
+        for condition, value in (("episode_id < ?", end_episode), ("step < ?", end_step),
+                                 ("reward_value >= ?", min_reward), ("reward_value <= ?", max_reward)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        # Flags are inlined so that SQLite can use the partial indexes on done and truncated
+        for column, value in (("done", done), ("truncated", truncated)):
+            if value is not None:
+                conditions.append(f"{column} = {int(bool(value))}")
+        query = f"SELECT {', '.join(selected_columns)} FROM steps WHERE {' AND '.join(conditions)} ORDER BY episode_id, step"
+        cache = {}
+        for rows in self.__iterate_rows(query, parameters, batch_size):
+            decoded = self.decode_step_rows(rows, selected_columns, cache)
+            batch = {column: decoded[column] for column in columns}
+            if as_batches:
+                yield batch
+            else:
+                for values in zip(*batch.values()):
+                    yield dict(zip(columns, values))
+
+    def iter_episodes(self, keys=None, start_episode=0, end_episode=None, done=None, truncated=None,
+                      min_reward=None, max_reward=None, batch_size=1000):
+        """Yields (episode id, episode data) pairs in episode order with bounded memory.
+
+        Args:
+            keys (list): If given, the episode data only contains the values of these (nested) keys, which are
+                read from the flattened episode keys without parsing the JSON episode data.
+            start_episode (int): First episode.
+            end_episode (int): Episode after the last episode (default: no limit).
+            done (bool): If given, only episodes with (True) or without (False) a terminated step.
+            truncated (bool): If given, only episodes with (True) or without (False) a truncated step.
+            min_reward (float): If given, only episodes with at least this collected reward.
+            max_reward (float): If given, only episodes with at most this collected reward.
+            batch_size (int): Number of rows that are fetched at once.
+        """
+        conditions = ["id >= ?"]
+        parameters = [start_episode]
+        for condition, value in (("id < ?", end_episode),
+                                 ("json_extract(episode_data, '$.collected_reward') >= ?", min_reward),
+                                 ("json_extract(episode_data, '$.collected_reward') <= ?", max_reward)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        for column, value in (("done", done), ("truncated", truncated)):
+            if value is not None:
+                negation = "" if value else "NOT "
+                conditions.append(f"id {negation}IN (SELECT episode_id FROM steps WHERE {column} = 1)")
+        if keys is not None:
+            yield from self.__iterate_episode_keys(keys, conditions, parameters, batch_size)
+            return
+        query = f"SELECT id, episode_data FROM episodes WHERE {' AND '.join(conditions)} ORDER BY id"
+        for rows in self.__iterate_rows(query, parameters, batch_size):
+            for episode, episode_data in rows:
+                yield episode, json.loads(episode_data)
+
+    def __iterate_episode_keys(self, keys, conditions, parameters, batch_size):
+        """Yields (episode id, {key: value}) pairs of the episodes that fulfill the conditions from the episode_keys table."""
+        keys = list(dict.fromkeys(str(key) for key in keys))
+        if len(keys) > MAX_JOINED_EPISODE_KEYS:
+            # More keys are resolved from the JSON episode data
+            query = f"SELECT id, episode_data FROM episodes WHERE {' AND '.join(conditions)} ORDER BY id"
+            for rows in self.__iterate_rows(query, parameters, batch_size):
+                for episode, episode_data in rows:
+                    resolved = resolve_episode_keys(json.loads(episode_data), {})
+                    yield episode, {key: resolved.get(key) for key in keys}
+            return
+        # One typed column per key, every join is a lookup in the primary key (key, episode_id)
+        columns = ", ".join(f"k{i}.value, k{i}.json" for i in range(len(keys)))
+        joins = " ".join(f"LEFT JOIN episode_keys AS k{i} ON k{i}.key = ? AND k{i}.episode_id = id" for i in range(len(keys)))
+        query = f"SELECT id, {columns} FROM episodes {joins} WHERE {' AND '.join(conditions)} ORDER BY id"
+        for rows in self.__iterate_rows(query, keys + parameters, batch_size):
+            for row in rows:
+                yield row[0], {key: json.loads(value) if is_json else value
+                               for key, value, is_json in zip(keys, row[1::2], row[2::2])}
+
+    def episode_key_types(self, keys):
+        """Returns the Arrow type names ("int64", "float64" or "string") of the episode keys whose stored values
+        all have compatible SQLite types; integers and floats of one key result in "float64". Keys with other
+        values (e.g. booleans or lists, which are stored as JSON) are left out."""
+        keys = list(dict.fromkeys(str(key) for key in keys))
+        placeholders = ", ".join("?" for _ in keys)
+        query = (f"SELECT key, json, typeof(value) FROM episode_keys WHERE key IN ({placeholders}) AND value IS NOT NULL "
+                 "GROUP BY key, json, typeof(value)")
+        value_types = {}
+        for rows in self.__iterate_rows(query, keys, MAX_JOINED_EPISODE_KEYS):
+            for key, is_json, value_type in rows:
+                value_types.setdefault(key, set()).add("json" if is_json else value_type)
+        column_types = {}
+        for key, types in value_types.items():
+            if types == {"integer"}:
+                column_types[key] = "int64"
+            elif types <= {"integer", "real"}:
+                column_types[key] = "float64"
+            elif types == {"text"}:
+                column_types[key] = "string"
+        return column_types
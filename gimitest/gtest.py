@@ -1,9 +1,21 @@
 import gymnasium as gym
 import numpy as np
-from queue import Queue
 import importlib
+import sys
 import copy
 import inspect
+from PIL import Image
+from gimitest.frames import FrameBuffer
+from gimitest.attributes import find_attribute_owner, AttributeIndex, ModuleAttributes, MAX_ATTRIBUTE_DEPTH
+from gimitest.snapshots import Snapshot, get_snapshot_adapter
+
+
+def default_hook(function):
+    """Marks a hook of GTest that does nothing, so that EnvDecorator skips it. The marker (and not the identity
+    of the function) is checked, since the examples import this module a second time as the module gtest."""
+    function.default_hook = True
+    return function
+
 
 class GTest:
 
@@ -15,37 +27,98 @@ class GTest:
         self.step_data = {}
         self.episode_data = {}
         self.parameters = parameters
+        # Last rendered frame as returned by render(), it is converted into a PIL image on access of current_image
+        self.current_frame = None
         self.current_image = None
+        self.frame_buffer = None
+        self.frame_sink = None
+        self.attribute_index = None
+        # Module attribute accessors per module name, the one of the current environment is resolved once per environment
+        self.module_attribute_accessors = {}
+        self.module_attributes_accessor = None
+        self.module_attributes_env = None
         self.decorated = True
+        # Set by EnvDecorator.decorate
+        self.original_step_function = None
+        self.old_style = False
 
 
+    @default_hook
     def pre_step_configuration(self):
         return None
 
+    @default_hook
     def pre_step_test(self, agent_selection, action):
         return None
     
+    @default_hook
     def post_step_configuration(self):
         return None
     
+    @default_hook
     def post_step_test(self, state, action, next_state, reward, terminated, truncated, info, agent_selection):
         return state, action, next_state, reward, terminated, truncated, info
     
+    @default_hook
     def pre_reset_configuration(self):
         return None
     
+    @default_hook
     def pre_reset_test(self):
         return None
 
+    @default_hook
     def post_reset_configuration(self, next_state):
         return None
     
+    @default_hook
     def post_reset_test(self):
         return None
     
+    @default_hook
     def post_render(self):
         return None
 
+    @property
+    def current_image(self):
+        """PIL image of the last rendered frame, which is converted from self.current_frame on the first access."""
+        if self.__current_image is None and self.current_frame is not None:
+            self.__current_image = Image.fromarray(self.current_frame)
+        return self.__current_image
+
+    @current_image.setter
+    def current_image(self, image):
+        self.__current_image = image
+
+    def set_current_frame(self, frame):
+        """Sets the last rendered frame (without copying it) and adds it to the frame buffer and the frame sink."""
+        self.current_frame = frame
+        self.__current_image = None
+        if self.frame_buffer is not None:
+            self.frame_buffer.append(frame)
+        if self.frame_sink is not None:
+            self.frame_sink.put(frame)
+
+    def enable_frame_buffer(self, capacity):
+        """Keeps the last capacity rendered frames of the episode in a preallocated ring buffer (self.frame_buffer),
+        which is cleared when the environment is reset.
+
+        Returns:
+            FrameBuffer: The frame buffer, whose frames() are the frames leading up to the current step.
+        """
+        self.frame_buffer = FrameBuffer(capacity)
+        return self.frame_buffer
+
+    def enable_frame_sink(self, frame_sink):
+        """Writes every rendered frame with a FrameSink (e.g. ImageSink, GifSink or ArraySink of gimitest.frames)
+        on its writer thread; every reset of the environment ends the episode of the sink.
+
+        Returns:
+            FrameSink: The frame sink, which has to be closed after the test.
+        """
+        self.frame_sink = frame_sink
+        return frame_sink
+
     def step_increment(self):
         self.step += 1
 
@@ -55,13 +128,36 @@ class GTest:
         self.step_data = {}
         self.episode_data = {}
 
+    def module_attributes(self):
+        """Returns the accessor of the attributes of the module where the current environment's class is defined.
+
+        The module is resolved once per environment object; the accessor reads and writes the module attributes
+        directly and remembers their original values, which clean_up() restores.
+
+        Returns:
+            ModuleAttributes: The module attribute accessor.
+        """
+        if self.module_attributes_env is not self.env:
+            module_name = self.env.unwrapped.__class__.__module__
+            accessor = self.module_attribute_accessors.get(module_name)
+            if accessor is None:
+                module = sys.modules.get(module_name)
+                if module is None:
+                    module = importlib.import_module(module_name)
+                accessor = ModuleAttributes(module)
+                # The accessors of replaced environments are kept for clean_up()
+                self.module_attribute_accessors[module_name] = accessor
+            self.module_attributes_env = self.env
+            self.module_attributes_accessor = accessor
+        return self.module_attributes_accessor
+
     def set_module_attribute(self, attribute_name, n_value):
         """
         Sets the value of a specified attribute in the module where the current environment's class is defined.
 
-        This method dynamically imports the module containing the environment's class and updates the specified attribute
-        with a new value. It is useful for modifying global settings or constants that affect the behavior of the
-        environment.
+        This method updates the specified attribute of the module (see module_attributes) with a new value.
+        It is useful for modifying global settings or constants that affect the behavior of the environment.
+        The original value is restored by clean_up().
 
         Parameters:
         - attribute_name (str): The name of the attribute to modify in the module.
@@ -70,18 +166,33 @@ class GTest:
         Returns:
             None
         """
-        env_class = self.env.unwrapped.__class__
-        module_name = env_class.__module__
-        module = importlib.import_module(module_name)
-        setattr(module, attribute_name, n_value)
+        self.module_attributes().set(attribute_name, n_value)
+
+    def set_module_attributes(self, values):
+        """
+        Sets several attributes of the module where the current environment's class is defined at once
+        (e.g. a sample of physics constants per episode); if one of them can not be set, none is changed.
+        The original values are restored by clean_up() or restore_module_attributes().
+
+        Parameters:
+        - values (dict): Attribute names and their new values.
+
+        Returns:
+            None
+        """
+        self.module_attributes().set_many(values)
+
+    def restore_module_attributes(self, attribute_names=None):
+        """Restores the original values of the changed module attributes (default: of all of them)."""
+        for accessor in self.module_attribute_accessors.values():
+            accessor.restore(attribute_names)
         
     def get_module_attribute(self, attribute_name):
         """
         Retrieves the value of a specified attribute from the module where the current environment's class is defined.
 
-        This method dynamically imports the module containing the environment's class and accesses the value of the
-        specified attribute. It is useful for obtaining configuration settings or constants from the module that may
-        influence the behavior of the environment.
+        This method accesses the value of the specified attribute of the module (see module_attributes). It is useful
+        for obtaining configuration settings or constants from the module that may influence the behavior of the environment.
 
         Parameters:
         - attribute_name (str): The name of the attribute to access in the module.
@@ -90,45 +201,14 @@ class GTest:
         The value of the specified attribute. The type of the return value depends on the attribute being accessed.
         If the attribute does not exist, an AttributeError will be raised.
         """
-        env_class = self.env.unwrapped.__class__
-        module_name = env_class.__module__
-        module = importlib.import_module(module_name)
-        return getattr(module, attribute_name)
-
-    def __set_breadth_first_attribute(self, root_obj, attribute_name, n_value):
-        """Sets the value of attribute attribute_name of the object using breadth-first search.
-        
-        Args:
-            root_obj (object): The root object whose attribute needs to be modified.
-            attribute_name (str): The name of the attribute to modify.
-            n_value (object): The new value to set.
-
-        Returns:
-            bool: True if the attribute was successfully modified, otherwise False.
-        """
-        
-        q = Queue()
-        q.put(root_obj)
-        
-        while not q.empty():
-            obj = q.get()
-            
-            if hasattr(obj, attribute_name):
-                setattr(obj, attribute_name, n_value)
-                return True
-            
-            for attr in dir(obj):
-                try:
-                    nested_attr = getattr(obj, attr)
-                    if isinstance(nested_attr, object) and not isinstance(nested_attr, (str, int, float, bytes)):
-                        q.put(nested_attr)
-                except:
-                    pass
-        
-        return False
+        return self.module_attributes().get(attribute_name)
 
     def set_attribute(self, env, attribute_name, n_value):
         """Sets the value of attribute attribute_name of the environment.
+
+        The object that defines the attribute is searched breadth-first in the object graph of the environment
+        (see gimitest.attributes.find_attribute_owner); the path to it is cached per environment class, so that
+        later calls only follow the path.
         
         Args:
             env (object): The gym environment object whose attribute needs to be modified.
@@ -139,48 +219,15 @@ class GTest:
             None: Modifies the attribute of the environment in place.
         
         Raises:
-            ValueError: If attribute name does not exist in the environment.
+            AttributeError: If attribute name does not exist in the environment.
         """
-        
-        is_attr_set = self.__set_breadth_first_attribute(env, attribute_name, n_value)
-        
-        if not is_attr_set:
+        owner = find_attribute_owner(env, attribute_name)
+        if owner is None:
             raise AttributeError(f"Attribute {attribute_name} does not exist in environment.")
-
-    def __get_breadth_first_attribute(self, root_obj, attribute_name):
-        """Fetches the value of attribute attribute_name of the object using breadth-first search.
-        
-        Args:
-            root_obj (object): The root object whose attribute value needs to be fetched.
-            attribute_name (str): The name of the attribute to fetch.
-
-        Returns:
-            object: The value of the attribute if found, otherwise None.
-        """
-        
-        q = Queue()
-        q.put(root_obj)
-        
-        while not q.empty():
-            obj = q.get()
-            
-            if hasattr(obj, attribute_name):
-                return getattr(obj, attribute_name)
-            
-            for attr in dir(obj):
-                try:
-                    nested_attr = getattr(obj, attr)
-                except:
-                    #print("Error", obj, attr)
-                    continue
-                
-                if isinstance(nested_attr, object) and not isinstance(nested_attr, (str, int, float, bytes)):
-                    q.put(nested_attr)
-                    
-        return None  # Return None if attribute is not found
+        setattr(owner, attribute_name, n_value)
 
     def get_attribute(self, env, attribute_name):
-        """Fetches the current attribute value of the environment.
+        """Fetches the current attribute value of the environment (see set_attribute).
         
         Args:
             env (object): The gym environment object whose state needs to be fetched.
@@ -192,11 +239,122 @@ class GTest:
         Raises:
             AttributeError: If attribute name does not exist in the environment.
         """
-        attr_value = self.__get_breadth_first_attribute(env, attribute_name)
-        if attr_value is not None:
-            return attr_value
-        else:
+        owner = find_attribute_owner(env, attribute_name)
+        if owner is None:
             raise AttributeError(f"Attribute {attribute_name} does not exist in environment.")
+        return getattr(owner, attribute_name)
+
+    def index_attributes(self, max_depth=MAX_ATTRIBUTE_DEPTH, include_properties=False):
+        """Builds the attribute index of the environment (self.attribute_index, see gimitest.attributes.AttributeIndex),
+        whose lookups, bulk reads and writes and type queries do not walk the object graph again.
+        The decorated reset marks the index stale, so it is rebuilt on its next use if the object graph changed.
+
+        Returns:
+            AttributeIndex: The attribute index.
+        """
+        self.attribute_index = AttributeIndex(self.env, max_depth, include_properties)
+        return self.attribute_index
+
+    def take_snapshot(self):
+        """Captures the state of the environment at the current step together with the episode, step, step_data
+        and episode_data of the test, so that mutated continuations can branch from a shared prefix of steps
+        instead of replaying it from the reset.
+
+        The environment is captured by the first adapter of gimitest.snapshots.SNAPSHOT_ADAPTERS that supports it
+        (state arrays of classic control environments, Box2D bodies or a deep copy of the environment's attributes).
+
+        Returns:
+            Snapshot: The snapshot, which can be restored several times.
+
+        Raises:
+            ValueError: If no snapshot adapter supports the environment.
+        """
+        adapter = get_snapshot_adapter(self.env)
+        return Snapshot(adapter, adapter.capture(self.env), copy.deepcopy(getattr(self.env, "tmp_storage_of_state", None)),
+                        self.episode, self.step, copy.deepcopy(self.step_data), copy.deepcopy(self.episode_data))
+
+    def restore_snapshot(self, snapshot, new_episode=False):
+        """Restores the environment and the test to a snapshot of take_snapshot.
+
+        Args:
+            snapshot (Snapshot): The snapshot.
+            new_episode (bool): If True, the continuation is counted as the next episode (with the step index of the
+                snapshot), so that a GLogger stores the steps of every branch under its own episode. Otherwise, a
+                GLogger replaces the logged steps of the abandoned branch with the ones of the continuation.
+
+        Returns:
+            object: The observation at the snapshot, from which the continuation starts.
+        """
+        snapshot.adapter.restore(self.env, snapshot.env_state)
+        observation = copy.deepcopy(snapshot.observation)
+        if hasattr(self.env, "tmp_storage_of_state"):
+            self.env.tmp_storage_of_state = observation
+        self.episode = self.episode + 1 if new_episode else snapshot.episode
+        self.step = snapshot.step
+        self.step_data = copy.deepcopy(snapshot.step_data)
+        self.episode_data = copy.deepcopy(snapshot.episode_data)
+        return observation
 
     def clean_up(self):
-        self.env.reset()
\ No newline at end of file
+        # Module constants that the test changed are rolled back
+        self.restore_module_attributes()
+        self.env.reset()
+
+
+class VectorGTest(GTest):
+
+    def __init__(self, env, agents=None, parameters={}):
+        """Test of a gymnasium.vector environment (see VectorEnvDecorator).
+
+        The step hooks receive the batched values of all sub-environments, the reset hooks are called per
+        sub-environment with its index. self.episodes and self.steps hold the episode and step index of every
+        sub-environment, self.step_data and self.episode_data one dictionary per sub-environment.
+        """
+        super().__init__(env, agents, parameters)
+        self.num_envs = env.num_envs
+        self.episodes = np.full(self.num_envs, -1)
+        self.steps = np.zeros(self.num_envs, dtype=int)
+        self.step_data = [{} for _ in range(self.num_envs)]
+        self.episode_data = [{} for _ in range(self.num_envs)]
+
+    @default_hook
+    def pre_step_test(self, actions):
+        """Returns None or the batch of actions that replaces the actions."""
+        return None
+
+    @default_hook
+    def post_step_test(self, states, actions, next_states, rewards, terminated, truncated, infos, episodes, steps):
+        """Receives the batched step of all sub-environments and the episode and step index of every sub-environment.
+        Finished sub-environments were already reset: their next states are the first states of their next episodes
+        (the last states are in infos["final_observation"]) and self.episode_data belongs to the next episode."""
+        return states, actions, next_states, rewards, terminated, truncated, infos
+
+    @default_hook
+    def pre_reset_configuration(self, env_index):
+        """Returns None or the keyword arguments of the reset of the sub-environment."""
+        return None
+
+    @default_hook
+    def pre_reset_test(self, env_index):
+        return None
+
+    @default_hook
+    def post_reset_configuration(self, env_index, next_state):
+        """Returns None or the first state of the sub-environment that replaces next_state."""
+        return None
+
+    @default_hook
+    def post_reset_test(self, env_index):
+        return None
+
+    def step_increment(self, done):
+        """Increments the steps of the sub-environments that were not reset during the step."""
+        self.steps[np.logical_not(done)] += 1
+
+    def episode_increment(self, env_index=None):
+        """Starts the next episode of a sub-environment (default: of all sub-environments)."""
+        for index in range(self.num_envs) if env_index is None else (env_index,):
+            self.episodes[index] += 1
+            self.steps[index] = 0
+            self.step_data[index] = {}
+            self.episode_data[index] = {}
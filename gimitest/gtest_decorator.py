@@ -1,11 +1,28 @@
+import copy
+from gimitest.env_decorator import EnvDecorator
+
+
 class GTestDecorator:
 
     @staticmethod
     def decorate_with_logger(gtest, glogger):
         gtest.post_step_test = GTestDecorator.__decorate_post_step_test(gtest, gtest.post_step_test, glogger)
         gtest.pre_reset_test = GTestDecorator.__decorate_pre_reset_test(gtest, gtest.pre_reset_test, glogger)
+        gtest.take_snapshot = GTestDecorator.__decorate_take_snapshot(gtest.take_snapshot, glogger)
+        gtest.restore_snapshot = GTestDecorator.__decorate_restore_snapshot(gtest, gtest.restore_snapshot, glogger)
+        # An already decorated environment has to call the new post_step_test
+        EnvDecorator.update_step_hooks(gtest)
         return gtest
     
+    @staticmethod
+    def episode_finished(terminated, truncated):
+        """Returns whether the episode ended; with the per-agent flags of parallel multi-agent environments,
+        the episode ends when every agent is terminated or truncated."""
+        if isinstance(terminated, dict):
+            truncated = truncated if isinstance(truncated, dict) else {}
+            return all(done or truncated.get(agent, False) for agent, done in terminated.items())
+        return terminated or truncated
+
     @staticmethod
     def __decorate_post_step_test(gtest, original_post_step_test, glogger):
         def wrapper(*action_args, **kwargs):
@@ -28,10 +45,12 @@ class GTestDecorator:
             glogger.step_storage(current_episode, current_step, original_state,  action_args, original_next_state, original_reward, original_terminated, original_truncated, original_info, gtest.step_data, agent_selection)
             # Increment the step
             gtest.step_increment()
-            if original_terminated or original_truncated:
+            if GTestDecorator.episode_finished(original_terminated, original_truncated):
                 # Store the episode
                 glogger.own_episode_storage(current_episode, gtest.episode_data, agent_selection)
                 glogger.episode_storage(current_episode, gtest.episode_data, agent_selection)
+                # Make sure that no buffered steps are lost, without waiting for the writer thread
+                glogger.flush(wait=False)
 
             return original_state, action_args, original_next_state, original_reward, original_terminated, original_truncated, original_info
 
@@ -43,9 +62,39 @@ class GTestDecorator:
             if gtest.episode != -1:
                 glogger.own_episode_storage(gtest.episode, gtest.episode_data, glogger.agent_selection)
                 glogger.episode_storage(gtest.episode, gtest.episode_data, glogger.agent_selection)
+                glogger.flush(wait=False)
             # Call the original step function
             original_pre_reset_test(*action_args, **kwargs)
             # Increment the episode
             gtest.episode_increment()
         return wrapper
-    
\ No newline at end of file
+    
+
+    @staticmethod
+    def __decorate_take_snapshot(original_take_snapshot, glogger):
+        def wrapper(*args, **kwargs):
+            snapshot = original_take_snapshot(*args, **kwargs)
+            # A continuation in the same episode starts from the episode statistics at the snapshot
+            snapshot.episode_statistics = copy.deepcopy(glogger.statistics)
+            return snapshot
+        return wrapper
+
+    @staticmethod
+    def __decorate_restore_snapshot(gtest, original_restore_snapshot, glogger):
+        def wrapper(snapshot, new_episode=False):
+            if new_episode:
+                # The abandoned branch is stored as its episode, the statistics of the next episode start empty
+                glogger.own_episode_storage(gtest.episode, gtest.episode_data, glogger.agent_selection)
+                glogger.episode_storage(gtest.episode, gtest.episode_data, glogger.agent_selection)
+                glogger.flush(wait=False)
+            else:
+                # The continuation replaces the logged steps of the abandoned branch
+                glogger.discard_steps(snapshot.episode, snapshot.step, gtest.episode)
+                if snapshot.episode_statistics is not None:
+                    glogger.statistics = copy.deepcopy(snapshot.episode_statistics)
+                    # The time between the last step of the branch and the next step is no step time
+                    glogger.statistics.last_time = None
+                else:
+                    glogger.statistics.reset()
+            return original_restore_snapshot(snapshot, new_episode)
+        return wrapper
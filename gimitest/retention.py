@@ -0,0 +1,80 @@
+from collections import deque
+
+
+class RetentionPolicy:
+
+    def keep_step(self, step, done, truncated):
+        """Returns True if the step is buffered for its episode. Called for every logged step."""
+        return True
+
+    def create_buffer(self):
+        """Returns the container that buffers the kept steps of an episode."""
+        return []
+
+    def keep_episode(self, episode, episode_data):
+        """Returns True if the buffered steps of the episode are stored. Called once per episode with the
+        complete episode data (including collected_reward etc.)."""
+        return True
+
+
+class KeepEveryKthStep(RetentionPolicy):
+
+    def __init__(self, k):
+        """Keeps every k-th step and the last step of every episode."""
+        self.k = k
+
+    def keep_step(self, step, done, truncated):
+        return step % self.k == 0 or bool(done) or bool(truncated)
+
+
+class KeepLastNSteps(RetentionPolicy):
+
+    def __init__(self, n):
+        """Keeps the last n steps of every episode in a ring buffer."""
+        self.n = n
+
+    def create_buffer(self):
+        return deque(maxlen=self.n)
+
+
+class KeepFailingEpisodes(RetentionPolicy):
+
+    def __init__(self, oracle, passing_interval=None):
+        """Keeps the steps of episodes for which the oracle fires.
+
+        Args:
+            oracle (callable): Called with the episode data, returns True if the episode failed.
+            passing_interval (int): If given, the steps of every passing_interval-th passing episode are kept, too.
+        """
+        self.oracle = oracle
+        self.passing_interval = passing_interval
+        self.number_of_passing_episodes = 0
+
+    def keep_episode(self, episode, episode_data):
+        if self.oracle(episode_data):
+            return True
+        self.number_of_passing_episodes += 1
+        return self.passing_interval is not None and (self.number_of_passing_episodes - 1) % self.passing_interval == 0
+
+
+class CombinedRetentionPolicy(RetentionPolicy):
+
+    def __init__(self, policies):
+        """Keeps a step or an episode only if all policies keep it (e.g. the last 100 steps of failing episodes)."""
+        self.policies = policies
+
+    def keep_step(self, step, done, truncated):
+        return all(policy.keep_step(step, done, truncated) for policy in self.policies)
+
+    def create_buffer(self):
+        # The smallest ring buffer of the policies
+        buffers = [policy.create_buffer() for policy in self.policies]
+        ring_buffers = [buffer for buffer in buffers if getattr(buffer, "maxlen", None) is not None]
+        if ring_buffers:
+            return min(ring_buffers, key=lambda buffer: buffer.maxlen)
+        return []
+
+    def keep_episode(self, episode, episode_data):
+        # Every policy sees every episode to keep its counters consistent
+        decisions = [policy.keep_episode(episode, episode_data) for policy in self.policies]
+        return all(decisions)
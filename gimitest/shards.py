@@ -0,0 +1,97 @@
+import glob
+import os
+import re
+import sqlite3
+from gimitest.glogger import GLogger, QUERYABLE_STEP_COLUMNS
+
+
+def find_shards(db_path):
+    """Returns the paths of the worker shards of a database, sorted by worker id."""
+    pattern = re.compile(re.escape(db_path) + r"\.worker(\d+)$")
+    shards = []
+    for path in glob.glob(glob.escape(db_path) + ".worker*"):
+        match = pattern.match(path)
+        if match is not None:
+            shards.append((int(match.group(1)), path))
+    return [path for _, path in sorted(shards)]
+
+
+def merge_shards(db_path, shard_paths=None, delete_shards=False):
+    """Merges the worker shards into one database with globally unique episode ids.
+
+    The shards are copied table by table in SQL, so no step is unpickled. The episodes of every shard get
+    the next free episode ids of the merged database, the episode data (and its flattened keys) gets the worker_id key, and the
+    episode_origins table maps every merged episode id to its worker and local episode id.
+    Array stores of the shards are not merged; their episodes keep the local ids.
+
+    Args:
+        db_path (str): Path of the merged database (it may already contain episodes).
+        shard_paths (list): Paths of the shards (default: all shards of db_path, see find_shards).
+        delete_shards (bool): If True, the shard files are deleted after merging.
+
+    Returns:
+        int: The number of merged episodes.
+
+    Raises:
+        ValueError: If the shards have different logging schemas or compression codecs.
+    """
+    if shard_paths is None:
+        shard_paths = find_shards(db_path)
+    shard_loggers = [GLogger(path) for path in shard_paths]
+    schemas = [(logger.schema, {field: (codec.name, codec.parameters()) for field, codec in logger.field_codecs.items()})
+               for logger in shard_loggers]
+    if any(schema != schemas[0] for schema in schemas):
+        raise ValueError("The shards have different logging schemas or compression codecs.")
+    # Creates the tables (and the indexes of deduplicated fields) of the merged database
+    if schemas:
+        GLogger(db_path, schema=schemas[0][0], compression=shard_loggers[0].field_codecs)
+    else:
+        GLogger(db_path)
+
+    columns = ", ".join(QUERYABLE_STEP_COLUMNS)
+    shard_columns = ", ".join(("episode_id + ?",) + QUERYABLE_STEP_COLUMNS[1:])
+    number_of_episodes = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('''CREATE TABLE IF NOT EXISTS episode_origins (
+                        id INTEGER PRIMARY KEY,
+                        worker_id INTEGER,
+                        local_episode_id INTEGER
+                    )''')
+        for path in shard_paths:
+            conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            try:
+                worker_id = conn.execute("SELECT worker_id FROM shard.shard_info").fetchone()[0]
+                next_id = max(conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM episodes").fetchone()[0],
+                              conn.execute("SELECT COALESCE(MAX(episode_id) + 1, 0) FROM steps").fetchone()[0])
+                first_local_id = conn.execute("SELECT MIN(episode_id) FROM (SELECT id AS episode_id FROM shard.episodes UNION ALL SELECT episode_id FROM shard.steps)").fetchone()[0]
+                if first_local_id is None:
+                    continue
+                offset = next_id - first_local_id
+                with conn:
+                    conn.execute("INSERT INTO episodes (id, episode_data) SELECT id + ?, json_set(episode_data, '$.worker_id', ?) FROM shard.episodes",
+                                 (offset, worker_id))
+                    conn.execute("INSERT INTO episode_keys (key, episode_id, value, json) SELECT key, episode_id + ?, value, json FROM shard.episode_keys WHERE key != 'worker_id'",
+                                 (offset,))
+                    conn.execute("INSERT INTO episode_keys (key, episode_id, value, json) SELECT 'worker_id', id + ?, ?, 0 FROM shard.episodes",
+                                 (offset, worker_id))
+                    conn.execute(f"INSERT INTO steps ({columns}) SELECT {shard_columns} FROM shard.steps", (offset,))
+                    conn.execute("INSERT OR IGNORE INTO observations (hash, data) SELECT hash, data FROM shard.observations")
+                    conn.execute("INSERT INTO agent_steps (episode_id, step, agent, reward, done, truncated) SELECT episode_id + ?, step, agent, reward, done, truncated FROM shard.agent_steps",
+                                 (offset,))
+                    cursor = conn.execute('''INSERT INTO episode_origins (id, worker_id, local_episode_id)
+                                             SELECT episode_id + ?, ?, episode_id FROM (SELECT id AS episode_id FROM shard.episodes UNION SELECT episode_id FROM shard.steps)''',
+                                          (offset, worker_id))
+                    number_of_episodes += cursor.rowcount
+            finally:
+                conn.execute("DETACH DATABASE shard")
+    finally:
+        conn.close()
+
+    if delete_shards:
+        for path in shard_paths:
+            # Shards in WAL mode may leave their journal files
+            for file_path in (path, path + "-wal", path + "-shm"):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+    return number_of_episodes
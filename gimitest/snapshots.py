@@ -0,0 +1,337 @@
+import copy
+import types
+from abc import ABC, abstractmethod
+import numpy as np
+
+# Attribute values that are captured by value
+SIMPLE_TYPES = (bool, int, float, complex, str, bytes, type(None), np.ndarray, np.generic)
+# Snapshot adapter per unwrapped environment class
+SNAPSHOT_ADAPTER_CACHE = {}
+
+
+def is_simple_value(value):
+    """Returns True for numbers, strings, arrays and tuples of them."""
+    if isinstance(value, tuple):
+        return all(isinstance(item, SIMPLE_TYPES) for item in value)
+    return isinstance(value, SIMPLE_TYPES)
+
+
+def copy_value(value):
+    return value.copy() if isinstance(value, np.ndarray) else value
+
+
+def capture_simple_attributes(obj):
+    """Returns copies of the simple instance attributes (see is_simple_value) of an object."""
+    return {name: copy_value(value) for name, value in vars(obj).items() if is_simple_value(value)}
+
+
+def restore_simple_attributes(obj, attributes):
+    # Arrays are copied again, so that a snapshot can be restored several times
+    for name, value in attributes.items():
+        setattr(obj, name, copy_value(value))
+
+
+def wrapper_chain(env):
+    """Returns the wrappers of an environment from the outermost to the innermost one."""
+    wrappers = []
+    unwrapped = getattr(env, "unwrapped", env)
+    while env is not unwrapped and "env" in vars(env):
+        wrappers.append(env)
+        env = vars(env)["env"]
+    return wrappers
+
+
+class SnapshotAdapter(ABC):
+
+    def supports(self, unwrapped):
+        """Returns True if the adapter can capture the unwrapped environment."""
+        return False
+
+    def capture(self, env):
+        """Captures the state of the environment: the simple attributes of its wrappers (e.g. the step counter of
+        TimeLimit), the state of its random number generator and the state that capture_env returns."""
+        unwrapped = getattr(env, "unwrapped", env)
+        random_generator = vars(unwrapped).get("_np_random")
+        random_state = copy.deepcopy(random_generator.bit_generator.state) if random_generator is not None else None
+        wrapper_states = [capture_simple_attributes(wrapper) for wrapper in wrapper_chain(env)]
+        return wrapper_states, random_state, self.capture_env(unwrapped)
+
+    def restore(self, env, state):
+        """Restores a state of the environment that capture returned."""
+        wrapper_states, random_state, env_state = state
+        unwrapped = getattr(env, "unwrapped", env)
+        self.restore_env(unwrapped, env_state)
+        for wrapper, wrapper_state in zip(wrapper_chain(env), wrapper_states):
+            restore_simple_attributes(wrapper, wrapper_state)
+        random_generator = vars(unwrapped).get("_np_random")
+        if random_state is not None and random_generator is not None:
+            random_generator.bit_generator.state = copy.deepcopy(random_state)
+
+    @abstractmethod
+    def capture_env(self, unwrapped):
+        """Override this method to return the state of the unwrapped environment."""
+
+    @abstractmethod
+    def restore_env(self, unwrapped, env_state):
+        """Override this method to restore a state of the unwrapped environment that capture_env returned."""
+
+
+class StateArrayAdapter(SnapshotAdapter):
+    """Captures environments whose state is held in simple attributes, like the classic control environments
+    (state array, step counters and parameters)."""
+
+    def supports(self, unwrapped):
+        return type(unwrapped).__module__.startswith("gymnasium.envs.classic_control") and hasattr(unwrapped, "state")
+
+    def capture_env(self, unwrapped):
+        return capture_simple_attributes(unwrapped)
+
+    def restore_env(self, unwrapped, env_state):
+        restore_simple_attributes(unwrapped, env_state)
+
+
+def is_box2d(value):
+    return type(value).__module__.split(".")[0] == "Box2D"
+
+
+def is_body(value):
+    return type(value).__name__ == "b2Body" and is_box2d(value)
+
+
+def body_state(body):
+    return tuple(body.position), body.angle, tuple(body.linearVelocity), body.angularVelocity, body.awake
+
+
+def set_body_state(body, state):
+    position, angle, linear_velocity, angular_velocity, awake = state
+    # Falling asleep restarts the sleep timer, which Box2D does not expose
+    body.awake = False
+    body.position = position
+    body.angle = angle
+    if awake:
+        body.awake = True
+        body.linearVelocity = linear_velocity
+        body.angularVelocity = angular_velocity
+
+
+def body_attributes(body):
+    """Returns the simple Python attributes of a body (e.g. ground_contact or ttl), which Box2D does not know."""
+    return {name: value for name, value in vars(body).items() if name != "this" and is_simple_value(value)}
+
+
+def fixture_definition(fixture):
+    shape = fixture.shape
+    if type(shape).__name__ == "b2CircleShape":
+        shape_definition = ("circle", shape.radius, tuple(shape.pos))
+    elif type(shape).__name__ == "b2PolygonShape":
+        shape_definition = ("polygon", [tuple(vertex) for vertex in shape.vertices])
+    else:
+        raise ValueError(f"Bodies with {type(shape).__name__} fixtures can not be recreated.")
+    filter_data = fixture.filterData
+    return (shape_definition, fixture.density, fixture.friction, fixture.restitution, fixture.sensor,
+            filter_data.categoryBits, filter_data.maskBits, filter_data.groupIndex)
+
+
+def create_dynamic_body(world, fixture_definitions, state, attributes):
+    """Creates a dynamic body from the fixture definitions, state and attributes of a destroyed body."""
+    from Box2D import b2CircleShape, b2FixtureDef, b2PolygonShape
+    fixtures = []
+    for shape_definition, density, friction, restitution, sensor, category_bits, mask_bits, group_index in fixture_definitions:
+        if shape_definition[0] == "circle":
+            shape = b2CircleShape(radius=shape_definition[1], pos=shape_definition[2])
+        else:
+            shape = b2PolygonShape(vertices=shape_definition[1])
+        fixtures.append(b2FixtureDef(shape=shape, density=density, friction=friction, restitution=restitution,
+                                     isSensor=sensor, categoryBits=category_bits, maskBits=mask_bits, groupIndex=group_index))
+    body = world.CreateDynamicBody(position=state[0], angle=state[1], fixtures=fixtures)
+    set_body_state(body, state)
+    for name, value in attributes.items():
+        setattr(body, name, value)
+    return body
+
+
+def attribute_owners(unwrapped):
+    """Returns (name, object) pairs of the environment (name None) and of the objects it references in public
+    attributes (e.g. the car of CarRacing), whose simple attributes and referenced bodies are captured."""
+    owners = [(None, unwrapped)]
+    for name, value in vars(unwrapped).items():
+        if (not name.startswith("_") and hasattr(value, "__dict__") and not callable(value) and not is_box2d(value)
+                and not isinstance(value, (type, types.ModuleType))):
+            owners.append((name, value))
+    return owners
+
+
+def referenced_bodies(unwrapped, skipped_names):
+    """Yields ((owner name, attribute name, list index), body) for the bodies in the attributes (or in lists in the
+    attributes) of the environment and of its referenced objects."""
+    for owner_name, owner in attribute_owners(unwrapped):
+        for name, value in vars(owner).items():
+            if owner_name is None and name in skipped_names:
+                continue
+            if is_body(value):
+                yield (owner_name, name, None), value
+            elif isinstance(value, (list, tuple)):
+                for index, item in enumerate(value):
+                    if is_body(item):
+                        yield (owner_name, name, index), item
+
+
+def follow_body_key(unwrapped, key):
+    owner_name, name, index = key
+    owner = unwrapped if owner_name is None else vars(unwrapped)[owner_name]
+    value = vars(owner)[name]
+    return value if index is None else value[index]
+
+
+def rebuild_contacts(world):
+    """Replaces the contacts of the world by new ones without accumulated impulses. The broad-phase proxies of the
+    moving bodies are recreated, too, since the contacts that exist depend on their enlarged bounding boxes."""
+    from Box2D import b2_staticBody
+    for contact in list(world.contacts):
+        world.contactManager.Destroy(contact)
+    for body in world.bodies:
+        if body.type != b2_staticBody and body.active:
+            body.active = False
+            body.active = True
+    world.contactManager.FindNewContacts()
+
+
+def step_without_warm_starting(world):
+    """Disables warm starting for the next step of the world, since the impulses of its joints can not be restored."""
+    if "Step" in vars(world):
+        return
+    warm_starting = world.warmStarting
+
+    def step(*args, **kwargs):
+        del world.Step
+        world.warmStarting = False
+        try:
+            type(world).Step(world, *args, **kwargs)
+        finally:
+            world.warmStarting = warm_starting
+
+    world.Step = step
+
+
+class Box2DAdapter(SnapshotAdapter):
+    """Captures Box2D environments: the position, angle, velocities and awake flag of every body of the world,
+    the motor settings of the joints, and the simple attributes of the environment, of the objects it references
+    and of the bodies it references (e.g. game_over, prev_shaping and the ground_contact flags of the legs).
+
+    Bodies in the lists TRANSIENT_BODY_ATTRIBUTES (e.g. the particles of LunarLander) are destroyed and recreated
+    from their fixtures. Box2D keeps solver state that can not be read (the warm starting impulses of contacts
+    and joints and the sleep timers), so capturing and restoring both normalize it: the contacts are rebuilt,
+    the sleep timers restart and the next step of the world does not warm start. The continuation after the
+    capture therefore equals every restored continuation.
+    """
+
+    # List attributes of bodies that the environments create and destroy while stepping
+    TRANSIENT_BODY_ATTRIBUTES = ("particles",)
+
+    def supports(self, unwrapped):
+        return is_box2d(vars(unwrapped).get("world"))
+
+    def capture_env(self, unwrapped):
+        world = unwrapped.world
+        transient_states = {}
+        transient_bodies = []
+        for name in Box2DAdapter.TRANSIENT_BODY_ATTRIBUTES:
+            bodies = vars(unwrapped).get(name)
+            if isinstance(bodies, list):
+                transient_states[name] = [([fixture_definition(fixture) for fixture in body.fixtures], body_state(body), body_attributes(body))
+                                          for body in bodies]
+                transient_bodies.extend(bodies)
+        body_states = [body_state(body) for body in world.bodies if not any(body == transient for transient in transient_bodies)]
+        referenced_body_attributes = {key: body_attributes(body) for key, body in referenced_bodies(unwrapped, transient_states)}
+        owner_attributes = {name: capture_simple_attributes(owner) for name, owner in attribute_owners(unwrapped)}
+        joint_states = [(getattr(joint, "motorSpeed", None), joint.GetMaxMotorTorque() if hasattr(joint, "GetMaxMotorTorque") else None)
+                        for joint in world.joints]
+        env_state = owner_attributes, body_states, referenced_body_attributes, transient_states, joint_states
+        # The live environment continues from the normalized state, too
+        self.restore_env(unwrapped, env_state)
+        return env_state
+
+    def restore_env(self, unwrapped, env_state):
+        owner_attributes, body_states, referenced_body_attributes, transient_states, joint_states = env_state
+        world = unwrapped.world
+        transient_bodies = []
+        for name, states in transient_states.items():
+            bodies = vars(unwrapped)[name]
+            for body in bodies:
+                world.DestroyBody(body)
+            bodies[:] = [create_dynamic_body(world, *state) for state in states]
+            transient_bodies.extend(bodies)
+        bodies = [body for body in world.bodies if not any(body == transient for transient in transient_bodies)]
+        if len(bodies) != len(body_states):
+            raise ValueError(f"The snapshot has {len(body_states)} bodies, but the world has {len(bodies)} bodies; "
+                             "bodies that were created or destroyed after the snapshot (except the ones in "
+                             "TRANSIENT_BODY_ATTRIBUTES) can not be restored.")
+        for body, state in zip(bodies, body_states):
+            set_body_state(body, state)
+        for joint, (motor_speed, max_motor_torque) in zip(world.joints, joint_states):
+            if motor_speed is not None:
+                joint.motorSpeed = motor_speed
+            if max_motor_torque is not None:
+                joint.maxMotorTorque = max_motor_torque
+        # The contact listener may change attributes (e.g. ground_contact), which are restored afterwards
+        rebuild_contacts(world)
+        step_without_warm_starting(world)
+        for key, attributes in referenced_body_attributes.items():
+            restore_simple_attributes(follow_body_key(unwrapped, key), attributes)
+        for name, owner in attribute_owners(unwrapped):
+            if name in owner_attributes:
+                restore_simple_attributes(owner, owner_attributes[name])
+
+
+class DeepCopyAdapter(SnapshotAdapter):
+    """Captures any environment whose instance attributes can be deep copied. Attributes that can not be deep
+    copied (e.g. render windows) are not captured and keep their values when a snapshot is restored."""
+
+    def supports(self, unwrapped):
+        return hasattr(unwrapped, "__dict__")
+
+    def capture_env(self, unwrapped):
+        env_state = {}
+        for name, value in vars(unwrapped).items():
+            try:
+                env_state[name] = copy.deepcopy(value)
+            except Exception:
+                pass
+        return env_state
+
+    def restore_env(self, unwrapped, env_state):
+        vars(unwrapped).update(copy.deepcopy(env_state))
+
+
+SNAPSHOT_ADAPTERS = [StateArrayAdapter(), Box2DAdapter(), DeepCopyAdapter()]
+
+
+def get_snapshot_adapter(env):
+    """Returns the first adapter of SNAPSHOT_ADAPTERS that supports the environment (cached per environment class).
+
+    Raises:
+        ValueError: If no adapter supports the environment.
+    """
+    unwrapped = getattr(env, "unwrapped", env)
+    adapter = SNAPSHOT_ADAPTER_CACHE.get(type(unwrapped))
+    if adapter is None:
+        adapter = next((adapter for adapter in SNAPSHOT_ADAPTERS if adapter.supports(unwrapped)), None)
+        if adapter is None:
+            raise ValueError(f"No snapshot adapter supports the environment {type(unwrapped).__name__}.")
+        SNAPSHOT_ADAPTER_CACHE[type(unwrapped)] = adapter
+    return adapter
+
+
+class Snapshot:
+
+    def __init__(self, adapter, env_state, observation, episode, step, step_data, episode_data):
+        """State of an environment and of the counters and data of its GTest at one step (see GTest.take_snapshot)."""
+        self.adapter = adapter
+        self.env_state = env_state
+        self.observation = observation
+        self.episode = episode
+        self.step = step
+        self.step_data = step_data
+        self.episode_data = episode_data
+        # Episode statistics of a GLogger at the snapshot (set by GTestDecorator.decorate_with_logger)
+        self.episode_statistics = None
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from gimitest.env_decorator import EnvDecorator
+from gimitest.gtest import GTest
+
+simple_spread_v3 = pytest.importorskip("pettingzoo.mpe.simple_spread_v3")
+
+
+class AgentRecorder(GTest):
+
+    def __init__(self, env):
+        super().__init__(env)
+        self.agent_selections = []
+
+    def post_step_test(self, state, action, next_state, reward, terminated, truncated, info, agent_selection):
+        self.agent_selections.append(agent_selection)
+        return state, action, next_state, reward, terminated, truncated, info
+
+
+def test_parallel_env_is_not_turn_based():
+    env = simple_spread_v3.parallel_env(max_cycles=5)
+    gtest = AgentRecorder(env)
+    EnvDecorator.decorate(env, gtest)
+    assert not EnvDecorator.is_turn_based(env)
+    env.reset(seed=0)
+    for _ in range(3):
+        next_states, rewards, terminated, truncated, infos = env.step({agent: env.action_space(agent).sample() for agent in env.agents})
+        assert set(rewards) == set(env.possible_agents)
+    assert gtest.agent_selections == [None] * 3
+
+
+def test_aec_env_is_turn_based():
+    env = simple_spread_v3.env(max_cycles=5)
+    gtest = AgentRecorder(env)
+    EnvDecorator.decorate(env, gtest)
+    assert EnvDecorator.is_turn_based(env)
+    env.reset(seed=0)
+    agents = []
+    for _ in range(3):
+        agents.append(env.agent_selection)
+        env.step(env.action_space(env.agent_selection).sample())
+    assert gtest.agent_selections == agents
+
+
+def test_parallel_env_with_agent_columns(tmp_path):
+    from gimitest.glogger import GLogger
+    from gimitest.gtest_decorator import GTestDecorator
+    env = simple_spread_v3.parallel_env(max_cycles=4)
+    gtest = GTest(env)
+    EnvDecorator.decorate(env, gtest)
+    glogger = GLogger(str(tmp_path / "log.db"), agent_columns=True)
+    GTestDecorator.decorate_with_logger(gtest, glogger)
+    rewards = []
+    for episode in range(2):
+        env.reset(seed=episode)
+        while env.agents:
+            _, reward, _, _, _ = env.step({agent: env.action_space(agent).sample() for agent in env.agents})
+            rewards.append(reward)
+    env.reset(seed=2)
+    glogger.close()
+    steps = list(glogger.iter_steps(columns=("episode_id", "step", "reward")))
+    assert [(row["episode_id"], row["step"]) for row in steps] == [(episode, step) for episode in range(2) for step in range(4)]
+    for row, reward in zip(steps, rewards):
+        assert row["reward"] == pytest.approx(reward)
+    assert glogger.load_episode(0)["collected_reward"] == pytest.approx(sum(sum(reward.values()) for reward in rewards[:4]))
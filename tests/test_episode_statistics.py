@@ -0,0 +1,53 @@
+import pytest
+from gimitest.episode_statistics import Aggregator, EpisodeStatistics, RunningStatistics, quantile_key
+from gimitest.glogger import episode_key_rows
+
+
+def test_quantile_keys_are_lossless():
+    assert [quantile_key(q) for q in (0.5, 0.9, 0.99, 0.999, 1.0)] == ["p50", "p90", "p99", "p99.9", "p100"]
+    statistics = RunningStatistics((0.999, 1.0))
+    for value in range(10):
+        statistics.update(value)
+    assert {"p99.9", "p100"} <= statistics.result().keys()
+
+
+def test_episode_keys_do_not_shadow_each_other():
+    statistics = EpisodeStatistics((0.5, 0.999))
+    for step, reward in enumerate([1.0, 3.0]):
+        statistics.update((0, step, None, 0, None, reward, False, False, {}, {}, None), reward, step * 0.5)
+    keys = {key: value for key, _, value, _ in episode_key_rows(0, statistics.result())}
+    assert keys["reward_mean"] == 2.0
+    assert keys["reward_count"] == 2
+    assert keys["step_time_mean"] == 0.5
+    assert keys["step_time_count"] == 1
+    assert "step_time_p99.9" in keys
+    assert "mean" not in keys
+
+
+class StepCounter(Aggregator):
+
+    def __init__(self):
+        self.steps = 0
+
+    def update(self, *step):
+        self.steps += 1
+
+    def result(self):
+        return self.steps
+
+
+def test_aggregator_without_reset():
+    statistics = EpisodeStatistics()
+    statistics.register("steps", StepCounter())
+    statistics.update((0, 0, None, 0, None, 1.0, False, False, {}, {}, None), 1.0, 0.0)
+    assert statistics.result()["steps"] == 1
+    statistics.reset()
+
+
+def test_aggregator_without_result_can_not_be_created():
+    class Incomplete(Aggregator):
+        def update(self, *step):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from gimitest.glogger import GLogger
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def log_episodes(glogger, rewards, gravities):
+    for episode, (reward, gravity) in enumerate(zip(rewards, gravities)):
+        for step in range(3):
+            glogger.step_storage(episode, step, np.zeros(2), 0, np.zeros(2), reward, step == 2, False, {}, {}, None)
+        glogger.episode_storage(episode, {"gravity": gravity, "seed": episode}, None)
+    glogger.flush()
+
+
+def test_export_mixes_int_and_float_values_across_batches(tmp_path):
+    glogger = GLogger(str(tmp_path / "log.db"))
+    log_episodes(glogger, [0, 0, 0.5, 0.5], [9, 9, 9.5, 9.5])
+
+    glogger.export_steps(str(tmp_path / "steps.parquet"), columns=("episode_id", "step", "reward"), batch_size=3)
+    steps = pq.read_table(str(tmp_path / "steps.parquet"))
+    assert str(steps.schema.field("reward").type) == "double"
+    assert steps.column("reward").to_pylist() == [0.0] * 6 + [0.5] * 6
+
+    glogger.export_episodes(str(tmp_path / "episodes.parquet"), keys=["gravity", "seed"], batch_size=2)
+    episodes = pq.read_table(str(tmp_path / "episodes.parquet"))
+    assert episodes.column("gravity").to_pylist() == [9.0, 9.0, 9.5, 9.5]
+    assert str(episodes.schema.field("seed").type) == "int64"
+    assert episodes.column("seed").to_pylist() == [0, 1, 2, 3]
@@ -0,0 +1,54 @@
+import threading
+import pytest
+import numpy as np
+from gimitest.glogger import GLogger
+
+
+def log_steps(glogger, infos, episode=0):
+    for step, info in enumerate(infos):
+        state = np.full(2, step, dtype=np.float32)
+        glogger.step_storage(episode, step, state, 0, state + 1, 1.0, step == len(infos) - 1, False, info, {}, None)
+    glogger.episode_storage(episode, {}, None)
+
+
+def test_asynchronous_writer_skips_only_the_failing_record(tmp_path):
+    glogger = GLogger(str(tmp_path / "log.db"), asynchronous=True, schema={"state": "deduplicate", "next_state": "deduplicate"})
+    infos = [{}, {}, {"lock": threading.Lock()}, {"lock": threading.Lock()}, {}]
+    log_steps(glogger, infos)
+    try:
+        glogger.flush()
+    except TypeError as e:
+        assert "lock" in str(e)
+    else:
+        raise AssertionError("The unpicklable step was not reported.")
+    log_steps(glogger, [{}, {}], episode=1)
+    glogger.close()
+    steps = [(row["episode_id"], row["step"]) for row in glogger.iter_steps(columns=("episode_id", "step"))]
+    assert steps == [(0, 0), (0, 1), (0, 4), (1, 0), (1, 1)]
+    assert glogger.load_episode(0) is not None
+    assert all(glogger.load_episode_step(episode, step)["state"] is not None for episode, step in ((0, 4), (1, 0), (1, 1)))
+
+
+def test_schema_of_a_database_with_steps_can_not_be_changed(tmp_path):
+    path = str(tmp_path / "log.db")
+    glogger = GLogger(path, schema={"state": "deduplicate"})
+    log_steps(glogger, [{}, {}])
+    glogger.close()
+    with pytest.raises(ValueError):
+        GLogger(path, schema={"info": "skip"})
+    reopened = GLogger(path)
+    assert reopened.schema["state"] == "deduplicate"
+    assert reopened.load_episode_step(0, 1)["state"] is not None
+    assert GLogger(path, schema={"state": "deduplicate"}).schema == reopened.schema
+
+
+def test_deduplicated_observations_with_a_bounded_cache(tmp_path, monkeypatch):
+    from gimitest import glogger as glogger_module
+    monkeypatch.setattr(glogger_module, "STORED_OBSERVATION_CACHE_SIZE", 2)
+    glogger = GLogger(str(tmp_path / "log.db"), schema={"state": "deduplicate", "next_state": "deduplicate"})
+    for episode in range(3):
+        log_steps(glogger, [{}] * 4, episode=episode)
+    assert len(glogger.stored_observation_hashes) == 2
+    assert glogger.count_distinct_states() == 5
+    assert all((glogger.load_episode_step(episode, 3)["next_state"] == 4).all() for episode in range(3))
+    glogger.close()
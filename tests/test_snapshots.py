@@ -0,0 +1,100 @@
+import gymnasium as gym
+import numpy as np
+import pytest
+from gimitest.env_decorator import EnvDecorator
+from gimitest.gtest import GTest
+
+
+def decorated_env(env_id, **kwargs):
+    env = gym.make(env_id, **kwargs)
+    gtest = GTest(env)
+    EnvDecorator.decorate(env, gtest)
+    return env, gtest
+
+
+def run(env, actions, render=False):
+    trajectory = []
+    for action in actions:
+        next_state, reward, terminated, truncated, _ = env.step(action)
+        if render:
+            env.render()
+        trajectory.append((np.asarray(next_state).tobytes(), reward, terminated, truncated))
+        if terminated or truncated:
+            break
+    return trajectory
+
+
+def assert_branches_are_deterministic(env, gtest, prefix, number_of_actions, render=False):
+    env.reset(seed=3)
+    env.action_space.seed(0)
+    run(env, [env.action_space.sample() for _ in range(prefix)], render)
+    snapshot = gtest.take_snapshot()
+    actions = [env.action_space.sample() for _ in range(number_of_actions)]
+    continuation = run(env, actions, render)
+    for _ in range(2):
+        gtest.restore_snapshot(snapshot)
+        assert run(env, actions, render) == continuation
+    assert gtest.step == snapshot.step
+
+
+@pytest.mark.parametrize("env_id", ["CartPole-v1", "Pendulum-v1", "Acrobot-v1"])
+def test_classic_control_branches_are_deterministic(env_id):
+    env, gtest = decorated_env(env_id)
+    assert_branches_are_deterministic(env, gtest, 10, 50)
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"enable_wind": True}])
+def test_lunar_lander_branches_are_deterministic(kwargs):
+    pytest.importorskip("Box2D")
+    from gymnasium.envs.box2d.lunar_lander import heuristic
+    env, gtest = decorated_env("LunarLander-v2", **kwargs)
+    for prefix in (0, 60, 120, 180):
+        state, _ = env.reset(seed=7)
+        for _ in range(prefix):
+            state, *_ = env.step(heuristic(env.unwrapped, state))
+        snapshot = gtest.take_snapshot()
+
+        def land(state):
+            trajectory = []
+            for _ in range(400):
+                state, reward, terminated, truncated, _ = env.step(heuristic(env.unwrapped, state))
+                trajectory.append((state.tobytes(), reward, terminated, truncated))
+                if terminated or truncated:
+                    break
+            return trajectory
+
+        continuation = land(state)
+        assert land(gtest.restore_snapshot(snapshot)) == continuation
+        assert land(gtest.restore_snapshot(snapshot)) == continuation
+
+
+def test_lunar_lander_particles_are_recreated():
+    pytest.importorskip("pygame")
+    env, gtest = decorated_env("LunarLander-v2", render_mode="rgb_array")
+    assert_branches_are_deterministic(env, gtest, 20, 100, render=True)
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_restore_with_logger(tmp_path, asynchronous):
+    from gimitest.glogger import GLogger
+    from gimitest.gtest_decorator import GTestDecorator
+    env, gtest = decorated_env("CartPole-v1")
+    glogger = GLogger(str(tmp_path / "log.db"), asynchronous=asynchronous)
+    GTestDecorator.decorate_with_logger(gtest, glogger)
+    env.reset(seed=0)
+    run(env, [0, 1] * 3)
+    snapshot = gtest.take_snapshot()
+    run(env, [0, 1] * 4)
+    # The continuation replaces the steps of the abandoned branch
+    gtest.restore_snapshot(snapshot)
+    run(env, [1, 0] * 3)
+    # The next branch is stored as its own episode
+    gtest.restore_snapshot(snapshot, new_episode=True)
+    run(env, [0, 1] * 5)
+    env.reset()
+    glogger.close()
+    steps = [(row["episode_id"], row["step"]) for row in glogger.iter_steps(columns=("episode_id", "step"))]
+    assert steps == [(0, step) for step in range(12)] + [(1, step) for step in range(6, 16)]
+    assert glogger.load_episode(0)["collected_reward"] == 12.0
+    assert glogger.load_episode(1)["collected_reward"] == 10.0
+    assert glogger.load_episode(1)["reward_statistics"]["reward_count"] == 10